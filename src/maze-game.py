@@ -4,25 +4,26 @@ Version 20241111
 Copyright: DOF Studio
 '''
 
+import os
+import argparse
 import pygame
 import random
 import numpy
 from collections import deque
-import json
 import time
-from tkinter import Tk, filedialog
-
-# Initialize Pygame and Tkinter for file dialog
-pygame.init()
-Tk().withdraw()  # Hide the root window for Tkinter
+from maze_engine import (
+    CELL_WALL, CELL_PATH, CELL_EXIT, DEFAULT_MAZE_WIDTH, DEFAULT_MAZE_HEIGHT, DEFAULT_MOVE_RANGE,
+    DEFAULT_DIFFICULTY, FPS, TICK_SECONDS, RandomStream, ReachCache, RoundState, RoundPrefetcher, SaveWorker,
+    TickClock
+)
+from maze_replay import ReplayRecorder
+from maze_profile import FrameProfiler
+from maze_tiles import open_tiled_maze, tiled_round
+from maze_ui import Button, InputBox, Label, Notifications, Panel, get_font
+from maze_assets import AssetCache
 
 # Constants and global settings
 DEFAULT_TILE_SIZE = 16
-DEFAULT_MAZE_WIDTH = 56   # Width and height should be odd numbers
-DEFAULT_MAZE_HEIGHT = 42
-DEFAULT_MOVE_RANGE = 20   # Number of steps for forward movement limit
-DEFAULT_DIFFICULTY = 32  # Default difficulty level
-FPS = 60
 
 # Colors
 WHITE = (255, 255, 255)
@@ -31,6 +32,7 @@ RED = (255, 0, 0)
 GREEN = (0, 255, 0)
 BLUE = (0, 0, 255)
 GRAY = (200, 200, 200)
+HOVER_GRAY = (180, 180, 180)
 
 # Extended Colors
 LIGHT_GRAY = (211, 211, 211)
@@ -56,17 +58,27 @@ NAVY = (0, 0, 128)
 # Global variables for customization and timing
 custom_player_default = "./res/res.ch.png"
 custom_background_default = "./res/res.bk.png"
-custom_player_image = None
-custom_background_image = None
+assets = AssetCache()  # The player and background images, loaded and scaled when first drawn
 TILE_SIZE = DEFAULT_TILE_SIZE
 current_seed = None
 start_time = None
 difficulty_level = DEFAULT_DIFFICULTY
 
-# Constants for water spread
-WATER_SPREAD_DELAY = 5           # Delay for 5 seconds
-WATER_SPREAD_RATE_NORMAL = 6     # Spread rate for non-downward paths (cells per second)
-WATER_SPREAD_RATE_DOWNWARD = 14  # Spread rate for downward paths (cells per second)
+# Flood simulation mode
+WATER_FLOOD_MODE = 'queue'       # 'queue' spreads water every frame, 'arrival' precomputes each round's flood
+
+# Show the click-to-move path under the mouse while it is within the move range
+HOVER_PREVIEW = True
+
+# Render backend of draw_maze: 'rects' draws a rect per cell, 'surfarray' scales one pixel per cell
+RENDER_BACKEND = 'rects'
+
+# Largest board area of the window in pixels; larger boards scroll under a camera
+MAX_VIEW_SIZE = (1280, 800)
+
+# Cells kept between the player and the edge of the view, and cells per mouse wheel notch
+CAMERA_MARGIN = 6
+SCROLL_CELLS = 3
 
 # Initialize the water queue
 water_queue = deque()
@@ -74,13 +86,65 @@ water_queue = deque()
 # Initialize global resume (True to pause, False to resume)
 resume_play = False
 
-# Load Default resources
-if custom_player_default != None:
-    custom_player_image = pygame.image.load(custom_player_default)
-    custom_player_image = pygame.transform.smoothscale(custom_player_image, (TILE_SIZE, TILE_SIZE))
-if custom_background_default != None:
-    custom_background_image = pygame.image.load(custom_background_default)
-    custom_background_image = pygame.transform.smoothscale(custom_background_image, (960, 640))
+# Display surface, created by main()
+screen = None
+
+# Set False to generate each round's maze when it starts instead of in a worker process
+PREFETCH_ROUNDS = True
+
+# Directory of the generated maze cache used by seeded sessions (None to disable)
+MAZE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".amaze", "cache")
+
+# Recorder of the run for --record (None when not recording)
+replay_recorder = None
+
+# Worker preparing the next round, created by main()
+round_prefetcher = None
+
+# Thread writing and reading save files, so the game goes on while they are written
+save_worker = SaveWorker()
+
+# Messages shown over the screen without stopping it (posted from any thread)
+notifications = Notifications()
+
+# Timer of the main loop stages (F3 shows the overlay, --trace records a timeline)
+frame_profiler = FrameProfiler()
+
+# Tkinter file dialog module, created on first use
+_filedialog = None
+
+# Function to get the Tkinter file dialog, hiding the root window on first use
+def get_filedialog():
+    global _filedialog
+    if _filedialog is None:
+        from tkinter import Tk, filedialog
+        Tk().withdraw()  # Hide the root window for Tkinter
+        _filedialog = filedialog
+    return _filedialog
+
+# Function to register the default player and background images (loaded on first use)
+def load_default_resources():
+    assets.register("player", custom_player_default)
+    assets.register("background", custom_background_default)
+
+# Function to get the player image at the current tile size, or None
+def player_image():
+    return assets.get("player", (TILE_SIZE, TILE_SIZE))
+
+# Function to get the background image at the size of a surface, or None
+def background_image(surface):
+    return assets.get("background", surface.get_size())
+
+# Function to use an uploaded image, keeping the previous one if it cannot be loaded
+def upload_image(name, path):
+    previous = assets.sources.get(name)
+    assets.register(name, path)
+    try:
+        assets.original(name)
+    except (pygame.error, OSError):
+        assets.register(name, previous)
+        return False
+    return True
 
 # Global timeer class
 class Timer:
@@ -118,127 +182,42 @@ class Timer:
     def get_total_time(self):
         return self.total_time
 
-# AI Assitant to find path
-def find_path_within_range(maze, start, end, max_steps):
-    queue = deque([(start, 0)])  # The queue holds tuples of (position, step_count)
-    visited = set()
-    visited.add(start)
-    parent = {start: None}
-
-    while queue:
-        current, steps = queue.popleft()
-        if current == end:
-            break  # Path found
-
-        x, y = current
-        if steps < max_steps:  # Only continue if the step limit is not exceeded
-            for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:  # Right, Down, Left, Up
-                nx, ny = x + dx, y + dy
-                if (0 <= nx < len(maze[0]) and 0 <= ny < len(maze) and
-                    maze[ny][nx] in (' ', 'E') and (nx, ny) not in visited):
-                    queue.append(((nx, ny), steps + 1))
-                    visited.add((nx, ny))
-                    parent[(nx, ny)] = current
-
-    # Reconstruct the path from end to start
-    path = []
-    step = end
-    while step:
-        path.append(step)
-        step = parent.get(step)
-    path.reverse()
-
-    return path if path and path[0] == start else []  # Return the path if valid, otherwise an empty list
-
-# Animation to make it smoother
-def animate_movement(screen, clock, maze, player_pos, path):
-    for step in path[1:]:  # Skip the starting position, as the player is already there
-        player_pos[0], player_pos[1] = step
-        draw_maze(screen, maze)
-
-        # Draw the player at the current step position
-        if custom_player_image:
-            screen.blit(custom_player_image, (player_pos[0] * TILE_SIZE, player_pos[1] * TILE_SIZE))
-        else:
-            pygame.draw.rect(screen, BLUE, (player_pos[0] * TILE_SIZE, player_pos[1] * TILE_SIZE, TILE_SIZE, TILE_SIZE))
-
-        # Draw the end position in red to make it clear
-        pygame.draw.rect(screen, RED, ((len(maze[0]) - 2) * TILE_SIZE, (len(maze) - 2) * TILE_SIZE, TILE_SIZE, TILE_SIZE))
+# Palette of the surfarray render backend: the cell codes, then water and path marks
+PALETTE_WATER = 3
+PALETTE_PATH = 4
+RENDER_PALETTE = [BLACK, WHITE, RED, LIGHT_BLUE, GREEN]
 
-        pygame.display.flip()  # Update the screen to show the player's new position
-        clock.tick(FPS)  # Control the speed of animation
+# Function to paint the menu background
+def draw_menu_background(surface):
+    surface.fill(WHITE)
+    background = background_image(surface)
+    if background:
+        surface.blit(background, (0, 0))
 
 # Function to show an input box with a submit button
 def show_input_box(screen, prompt, x, y, width, height, digit_only=False):
-    font = pygame.font.Font(None, 30)
-    input_text = ""
-    input_active = True
-    submit_button_rect = pygame.Rect(x + width + 10, y, 80, height)
-
-    while input_active:
-        screen.fill(WHITE)
-        pygame.draw.rect(screen, WHITE, (x, y, width, height))
-        pygame.draw.rect(screen, BLACK, (x, y, width, height), 2)
-
-        # Draw the Submit button
-        create_button(screen, "Submit", x + width + 10, y, 80, height, GRAY, (180, 180, 180))
-
-        # Display the prompt and input text
-        prompt_surface = font.render(prompt, True, BLACK)
-        screen.blit(prompt_surface, (x, y - 30))
-        text_surface = font.render(input_text, True, BLACK)
-        screen.blit(text_surface, (x + 5, y + 5))
-
-        pygame.display.flip()
+    clock = pygame.time.Clock()
+    # Limit input length to prevent overflow
+    input_box = InputBox((x, y, width, height), digit_only, max_length=width // 10)
+    submit_button = Button("Submit", (x + width + 10, y, 80, height), GRAY, HOVER_GRAY)
+    panel = Panel([Label(prompt, (x, y - 30)), input_box, submit_button], background=lambda surface: surface.fill(WHITE))
 
+    while True:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
 
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_RETURN:
-                    input_active = False
-                elif event.key == pygame.K_BACKSPACE:
-                    input_text = input_text[:-1]
-                else:
-                    if digit_only and event.unicode.isdigit():
-                        input_text += event.unicode
-                    elif not digit_only:
-                        input_text += event.unicode
-
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                mouse_x, mouse_y = pygame.mouse.get_pos()
-                if submit_button_rect.collidepoint(mouse_x, mouse_y):
-                    input_active = False  # Exit the loop when the submit button is clicked
-
-        # Limit input length to prevent overflow
-        input_text = input_text[:width // 10]
-
-    return input_text.strip()
-
-# Function to create a button
-def create_button(screen, text, x, y, width, height, inactive_color, active_color, font_size=30):
-    font = pygame.font.Font(None, font_size)
-    mouse = pygame.mouse.get_pos()
-    click = pygame.mouse.get_pressed()
-
-    if x + width > mouse[0] > x and y + height > mouse[1] > y:
-        pygame.draw.rect(screen, active_color, (x, y, width, height))
-        if click[0] == 1:  # Button is clicked (left mouse button)
-            return True  # Only return True when the button is clicked
-    else:
-        pygame.draw.rect(screen, inactive_color, (x, y, width, height))
+            # Enter in the box or a click on the Submit button
+            elif panel.handle_event(event) is not None:
+                return input_box.text.strip()
 
-    text_surface = font.render(text, True, BLACK)
-    text_rect = text_surface.get_rect(center=(x + width // 2, y + height // 2))
-    screen.blit(text_surface, text_rect)
-    return False  # Return False when not clicked
+        pygame.display.update(panel.draw(screen))
+        clock.tick(FPS)
 
 # Function to enter the setting screen
 def show_settings_screen(screen):
-    global TILE_SIZE, resume_play, custom_player_image, custom_background_image, difficulty_level
-    font = pygame.font.Font(None, 36)
+    global TILE_SIZE, resume_play, difficulty_level
     running = True
     clock = pygame.time.Clock()
     
@@ -246,436 +225,428 @@ def show_settings_screen(screen):
     if resume_play == False:
         resume_play = True
 
-    while running:
-        screen.fill(WHITE)
-        if custom_background_image:
-            screen.blit(custom_background_image, (0, 0))
-        title = font.render("Settings", True, BLACK)
-        screen.blit(title, (50, 20))
-
-        # Button positions and dimensions
-        resize_button_rect = pygame.Rect(50, 100, 300, 50)
-        upload_player_button_rect = pygame.Rect(50, 170, 300, 50)
-        upload_background_button_rect = pygame.Rect(50, 240, 300, 50)
-        adjust_difficulty_button_rect = pygame.Rect(50, 310, 300, 50)
-        back_button_rect = pygame.Rect(50, 380, 300, 50)
-
-        # Draw the buttons
-        create_button(screen, "Resize Tile Size", 50, 100, 300, 50, GRAY, (180, 180, 180))
-        create_button(screen, "Upload Player Image", 50, 170, 300, 50, GRAY, (180, 180, 180))
-        create_button(screen, "Upload Background Image", 50, 240, 300, 50, GRAY, (180, 180, 180))
-        create_button(screen, "Adjust Difficulty", 50, 310, 300, 50, GRAY, (180, 180, 180))
-        create_button(screen, "Back to Main Menu", 50, 380, 300, 50, GRAY, (180, 180, 180))
+    # The buttons, rendered once and drawn again only when hovered or after a dialog
+    panel = Panel(background=draw_menu_background)
+    panel.add(Label("Settings", (50, 20), 36))
+    resize_button = panel.add(Button("Resize Tile Size", (50, 100, 300, 50), GRAY, HOVER_GRAY))
+    upload_player_button = panel.add(Button("Upload Player Image", (50, 170, 300, 50), GRAY, HOVER_GRAY))
+    upload_background_button = panel.add(Button("Upload Background Image", (50, 240, 300, 50), GRAY, HOVER_GRAY))
+    adjust_difficulty_button = panel.add(Button("Adjust Difficulty", (50, 310, 300, 50), GRAY, HOVER_GRAY))
+    back_button = panel.add(Button("Back to Main Menu", (50, 380, 300, 50), GRAY, HOVER_GRAY))
 
+    while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
 
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                mouse_x, mouse_y = pygame.mouse.get_pos()
-
-                # Check if Resize Tile Size button is clicked
-                if resize_button_rect.collidepoint(mouse_x, mouse_y):
-                    new_tile_size = show_input_box(screen, "Enter new tile size (digits only):", 50, 450, 300, 50, digit_only=True)
-                    if new_tile_size.isdigit() and int(new_tile_size) > 0:
-                        TILE_SIZE = int(new_tile_size)
-                        show_notification(screen, f"Tile size set to {TILE_SIZE}", 1500)
-
-                # Check if Upload Player Image button is clicked
-                elif upload_player_button_rect.collidepoint(mouse_x, mouse_y):
-                    image_path = filedialog.askopenfilename(title="Select Player Image")
-                    if image_path:
-                        custom_player_image = pygame.image.load(image_path)
-                        custom_player_image = pygame.transform.smoothscale(custom_player_image, (TILE_SIZE, TILE_SIZE))
-                        show_notification(screen, "Player image uploaded successfully!", 1500)
-
-                # Check if Upload Background Image button is clicked
-                elif upload_background_button_rect.collidepoint(mouse_x, mouse_y):
-                    image_path = filedialog.askopenfilename(title="Select Background Image")
-                    if image_path:
-                        custom_background_image = pygame.image.load(image_path)
-                        custom_background_image = pygame.transform.smoothscale(custom_background_image, (960, 640))
-                        show_notification(screen, "Background image uploaded successfully!", 1500)
-
-                # Check if Adjust Difficulty button is clicked
-                elif adjust_difficulty_button_rect.collidepoint(mouse_x, mouse_y):
-                    new_difficulty = show_input_box(screen, "Enter difficulty level (1-100):", 50, 450, 300, 50, digit_only=True)
-                    if new_difficulty.isdigit() and 1 <= int(new_difficulty) <= 100:
-                        difficulty_level = int(new_difficulty)
-                        show_notification(screen, f"Difficulty set to {difficulty_level}", 1500)
-
-                # Check if Back button is clicked
-                elif back_button_rect.collidepoint(mouse_x, mouse_y):
-                    running = False  # Exit the settings screen
-
-        pygame.display.flip()
+            clicked = panel.handle_event(event)
+            if clicked is None:
+                continue
+            panel.invalidate()  # The dialogs draw over the screen
+
+            # Check if Resize Tile Size button is clicked
+            if clicked is resize_button:
+                new_tile_size = show_input_box(screen, "Enter new tile size (digits only):", 50, 450, 300, 50, digit_only=True)
+                if new_tile_size.isdigit() and int(new_tile_size) > 0:
+                    TILE_SIZE = int(new_tile_size)
+                    notifications.post(f"Tile size set to {TILE_SIZE}", 1500)
+
+            # Check if Upload Player Image button is clicked
+            elif clicked is upload_player_button:
+                image_path = get_filedialog().askopenfilename(title="Select Player Image")
+                if image_path and upload_image("player", image_path):
+                    notifications.post("Player image uploaded successfully!", 1500)
+                elif image_path:
+                    notifications.post("Failed to load the image.", 1500)
+
+            # Check if Upload Background Image button is clicked
+            elif clicked is upload_background_button:
+                image_path = get_filedialog().askopenfilename(title="Select Background Image")
+                if image_path and upload_image("background", image_path):
+                    notifications.post("Background image uploaded successfully!", 1500)
+                elif image_path:
+                    notifications.post("Failed to load the image.", 1500)
+
+            # Check if Adjust Difficulty button is clicked
+            elif clicked is adjust_difficulty_button:
+                new_difficulty = show_input_box(screen, "Enter difficulty level (1-100):", 50, 450, 300, 50, digit_only=True)
+                if new_difficulty.isdigit() and 1 <= int(new_difficulty) <= 100:
+                    difficulty_level = int(new_difficulty)
+                    notifications.post(f"Difficulty set to {difficulty_level}", 1500)
+
+            # Check if Back button is clicked
+            elif clicked is back_button:
+                running = False  # Exit the settings screen
+
+        # Show the notifications, drawing the screen again where one went away
+        if notifications.update():
+            panel.invalidate()
+        pygame.display.update(panel.draw(screen) + notifications.draw(screen))
         clock.tick(FPS)
         
     # Resume false, restart game now
     resume_play = False
 
-# Function to initialize water grid
-def initialize_water_grid(width, height):
-    """Initialize a grid to track water-occupied cells."""
-    return [[False for _ in range(width)] for _ in range(height)]
-
-# Function to initialize water in the starting position
-def initialize_water(water_grid, water_queue, start_pos):
-    """Initialize water at the starting position."""
-    x, y = start_pos
-    water_grid[y][x] = True
-    water_queue.append((x, y, 'normal'))  # Start spreading normally
-
-# Update water in the grid
-def update_water(maze, water_grid, water_queue, delta_time, water_parameters):
-    """
-    Update water spread based on elapsed time.
-
-    Args:
-        maze: The maze grid.
-        water_grid: Grid tracking water-occupied cells.
-        water_queue: Queue managing water spread events.
-        delta_time: Time elapsed since last update.
-        water_parameters: Dictionary containing spread rates and other configurations.
-    """
-    # Accumulate elapsed time
-    water_parameters['elapsed'] += delta_time
-    
-    # Get parameters
-    rate_normal = water_parameters['normal']
-    rate_downrard = water_parameters['downward']
-
-    # Process water spread based on elapsed time and spread rates
-    while water_queue:
-        x, y, direction = water_queue[0]
-
-        # Determine spread rate based on direction
-        if direction == 'downward':
-            spread_rate = rate_downrard
-        else:
-            spread_rate = rate_normal
-            
-        # Introduce some random term
-        random_ela = numpy.random.rand() * 1 / spread_rate
-        
-        # If a bonus happens, remove the time increment
-        if numpy.random.rand() * 0.25 > numpy.random.rand():
-            water_parameters['elapsed'] -= numpy.random.rand() * 0.25 / spread_rate
-            water_parameters['elapsed'] = max(water_parameters['elapsed'], 0)
-
-        # Check if enough time has passed to spread to next cell
-        if water_parameters['elapsed'] >= (1 / spread_rate + random_ela):
-            water_queue.popleft()  # Remove the current event
-            water_parameters['elapsed'] -= (1 / spread_rate + random_ela)   # Reset elapsed time
-
-            # Determine possible directions to spread
-            directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # Left, Right, Up, Down
-            # Optionally shuffle directions for randomness
-            random.shuffle(directions)
-
-            for dx, dy in directions:
-                nx, ny = x + dx, y + dy
-
-                # Check bounds
-                if 0 <= nx < len(maze[0]) and 0 <= ny < len(maze):
-                    # Check if the cell is a path and not already occupied by water
-                    if maze[ny][nx] in (' ', 'E') and not water_grid[ny][nx]:
-                        # Determine if the spread is downward
-                        if dy == 1:
-                            new_direction = 'downward'
-                        else:
-                            new_direction = 'normal'
-
-                        # Occupy the cell with water
-                        water_grid[ny][nx] = True
-
-                        # Enqueue the new water spread event
-                        water_queue.append((nx, ny, new_direction))
-            # Continue processing without breaking to allow spreading in all directions
-        else:
-            break  # Not enough time has passed to spread further
-
-# Function to generate a maze using DFS
-def generate_maze(width, height, seed=None, difficulty=DEFAULT_DIFFICULTY):
-    if seed is not None:
-        random.seed(seed)
-    maze = [['#' for _ in range(width)] for _ in range(height)]
-    start_x, start_y = 1, 1
-
-    def carve_passages(x, y):
-        directions = [(0, 2), (2, 0), (0, -2), (-2, 0)]
-        random.shuffle(directions)
-
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            if 1 <= nx < width - 1 and 1 <= ny < height - 1 and maze[ny][nx] == '#':
-                maze[ny][nx] = ' '
-                maze[y + dy // 2][x + dx // 2] = ' '
-                carve_passages(nx, ny)
-
-    maze[start_y][start_x] = ' '
-    carve_passages(start_x, start_y)
-    maze[height - 2][width - 2] = 'E'  # Mark the exit
-
-    # Find the solution path to protect it when adding dead ends
-    solution_path = find_solution_path(maze, (start_x, start_y), (width - 2, height - 2))
-
-    # Add dead ends based on difficulty without modifying the solution path
-    add_dead_end_branches(maze, difficulty, solution_path)
-    return maze
-
-# Function to find the solution path using BFS
-def find_solution_path(maze, start, end):
-    width = len(maze[0])
-    height = len(maze)
-    queue = deque()
-    queue.append((start, [start]))
-    visited = set()
-    visited.add(start)
-
-    while queue:
-        (x, y), path = queue.popleft()
-        if (x, y) == end:
-            return set(path)  # Return the solution path as a set for quick lookup
-
-        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            nx, ny = x + dx, y + dy
-            if (0 <= nx < width and 0 <= ny < height and
-                maze[ny][nx] in (' ', 'E') and (nx, ny) not in visited):
-                visited.add((nx, ny))
-                queue.append(((nx, ny), path + [(nx, ny)]))
-    return set()  # Return empty set if no path is found
-
-# Function to add dead-end branches to the maze without affecting the solution path
-def add_dead_end_branches(maze, difficulty, solution_path):
-    """
-    Adds dead-end branches to the maze to increase difficulty.
-    The number and length of branches are determined by the difficulty level.
-    """
-    num_branches = min(difficulty, 100)  # Cap the number of branches to prevent over-fragmentation
-    width = len(maze[0])
-    height = len(maze)
-    branch_length_range = max(1, min(difficulty // 10, 10))  # Adjust branch length based on difficulty
-
-    potential_branch_points = [
-        (x, y) for y in range(1, height - 1) for x in range(1, width - 1)
-        if maze[y][x] == ' ' and (x, y) in solution_path
-    ]
-
-    random.shuffle(potential_branch_points)
-
-    branches_added = 0
-
-    for (x, y) in potential_branch_points:
-        if branches_added >= num_branches:
-            break
-
-        # Possible directions to branch off (ensure they don't go back into the solution path)
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-        random.shuffle(directions)
-
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            if (1 <= nx < width - 1 and 1 <= ny < height - 1 and maze[ny][nx] == '#'):
-                # Carve a new branch
-                maze[ny][nx] = ' '
-                maze[y + dy // 2][x + dx // 2] = ' '
-
-                # Determine the length of the branch
-                branch_length = random.randint(1, branch_length_range)
-
-                current_x, current_y = nx, ny
-                branch_successful = True
-
-                for _ in range(branch_length):
-                    # Choose a new direction for the branch, avoiding reversing
-                    possible_dirs = [d for d in directions if d != (-dx, -dy)]
-                    if not possible_dirs:
-                        break
-                    branch_dir = random.choice(possible_dirs)
-                    bdx, bdy = branch_dir
-                    next_x, next_y = current_x + bdx, current_y + bdy
-
-                    # Check if the next cell is available for carving
-                    if (1 <= next_x < width - 1 and 1 <= next_y < height - 1 and
-                        maze[next_y][next_x] == '#'):
-
-                        # Ensure that carving here doesn't create a loop
-                        if count_wall_neighbors(maze, next_x, next_y) >= 3:
-                            maze[next_y][next_x] = ' '
-                            maze[current_y + bdy // 2][current_x + bdx // 2] = ' '
-                            current_x, current_y = next_x, next_y
-                        else:
-                            branch_successful = False
-                            break
-                    else:
-                        branch_successful = False
-                        break
-
-                # Terminate the branch to make it a dead end
-                # No action needed since the loop stops carving further
-
-                branches_added += 1
-                break  # Move to the next branch point after adding one branch
-
-# Function to count wall neighbors
-def count_wall_neighbors(maze, x, y):
-    """Helper function to count how many neighboring cells are walls."""
-    count = 0
-    for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-        nx, ny = x + dx, y + dy
-        if maze[ny][nx] == '#':
-            count += 1
-    return count
-
-# Adjust move range dynamically based on path type
-def adjust_move_range(maze, player_pos):
-    x, y = player_pos
-    straight_paths = 0
-
-    for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-        nx, ny = x + dx, y + dy
-        if 0 <= nx < len(maze[0]) and 0 <= ny < len(maze) and maze[ny][nx] == ' ':
-            straight_paths += 1
-
-    if straight_paths == 2:  # Path is a corner
-        return int(DEFAULT_MOVE_RANGE * 0.5)
-    elif straight_paths >= 3:  # Path is straight with more options
-        return int(DEFAULT_MOVE_RANGE * 1.2)
-    return DEFAULT_MOVE_RANGE
-
-# Save game state to a JSON file, including the maze structure and other data
+# Save game state to a file chosen by the player, writing it in the background
 def save_game_state(player_pos, maze, seed, start_time, difficulty, water_grid, water_queue, water_parameters):
-    global resume_play
-    
-    # Resume it if not
-    if resume_play == False:
-        resume_play = True
-    
     current_time = time.time() - start_time
-    game_state = {
-        "player_pos": player_pos,
-        "maze": maze,
-        "seed": seed,
-        "time_elapsed": current_time,
-        "difficulty": difficulty,
-        "water_grid": water_grid,
-        "water_queue": list(water_queue),  # Convert deque to list for JSON serialization
-        "water_parameters": water_parameters
-    }
-    # Open a file dialog to choose the save location
-    save_path = filedialog.asksaveasfilename(
-        defaultextension=".json",
-        filetypes=[("JSON files", "*.json")],
+    # Open a file dialog to choose the save location (Tk must stay on this thread)
+    save_path = get_filedialog().asksaveasfilename(
+        defaultextension=".amz",
+        filetypes=[("Maze saves", "*.amz"), ("JSON files", "*.json")],
         title="Save Game State"
     )
     if save_path:
-        with open(save_path, "w") as file:
-            json.dump(game_state, file)
-        show_notification(screen, "Game saved successfully!", 1500)
-        
-    # Resume false, restart game now
-    resume_play = False
+        # Binary save, or the legacy JSON format if a .json name was chosen; the
+        # worker writes a snapshot of the state, so the round goes on meanwhile
+        future = save_worker.save(save_path, player_pos, maze, seed, current_time, difficulty,
+                                  water_grid, water_queue, water_parameters)
+        future.add_done_callback(report_save)
+
+# Function to tell the player how a background save went (called on the worker thread)
+def report_save(future):
+    if future.exception() is None:
+        notifications.post("Game saved successfully!", 1500)
+    else:
+        notifications.post("Failed to save the game.", 1500)
 
 # Load game state from a custom location, ensuring the same maze structure is loaded
 def load_game_state():
-    global resume_play
-    
-    # Resume it if not
-    if resume_play == False:
-        resume_play = True
-    
+    """
+    Ask for a save file and start reading it in the background. Return the
+    Future of the game state (see finish_load), or None if canceled.
+    """
     # Open a file dialog to choose the file to load
-    load_path = filedialog.askopenfilename(
-        filetypes=[("JSON files", "*.json")],
+    load_path = get_filedialog().askopenfilename(
+        filetypes=[("Maze saves", "*.amz *.json"), ("All files", "*.*")],
         title="Load Game State"
     )
     if load_path:
-        try:
-            with open(load_path, "r") as file:
-                game_state = json.load(file)
-            return (
-                game_state["player_pos"],
-                game_state["maze"],
-                game_state["seed"],
-                game_state["time_elapsed"],
-                game_state["difficulty"],
-                game_state["water_grid"],
-                deque(game_state["water_queue"]),
-                game_state["water_parameters"]
-            )
-        except (FileNotFoundError, json.JSONDecodeError):
-            show_notification(screen, "Failed to load the game. Invalid file or format.", 1500)
-            # Resume false, restart game now
-            resume_play = False
-            return None
-    else:
-        show_notification(screen, "Loading canceled.", 1500)
-        # Resume false, restart game now
-        resume_play = False
+        return save_worker.load(load_path)  # Binary and legacy JSON saves
+    notifications.post("Loading canceled.", 1500)
+    return None
+
+# Function to take the game state of a finished load, or None if the file could not be read
+def finish_load(future):
+    try:
+        return future.result()
+    except (OSError, ValueError, KeyError, TypeError):
+        notifications.post("Failed to load the game. Invalid file or format.", 1500)
         return None
-    
-    # Resume false, restart game now
-    resume_play = False
-    
 
-# Show notification in game
-def show_notification(screen, message, duration=1500):
-    font = pygame.font.Font(None, 36)
-    notification = font.render(message, True, ORANGE)
-    screen.blit(notification, (10, 10))
-    pygame.display.flip()
-    pygame.time.wait(duration)
+# Palettized one-pixel-per-cell rendering
+class PaletteLayer:
+    """
+    Renders cells as one pixel each into an 8-bit palettized Surface, then scales
+    it by the tile size in one go.
+
+    Pixel values are the cell codes themselves, with water and path marks on top,
+    so RENDER_PALETTE maps them straight to colours. Open cells are the colour key
+    and let whatever is under the layer (the background) show through. The cost
+    depends only on the number of cells and pixels, not on how many are walls or
+    flooded.
+    """
+    def __init__(self):
+        self.surface = None
+        self.scaled = None
+
+    def _palettized(self, size):
+        surface = pygame.Surface(size, depth=8)
+        surface.set_palette(RENDER_PALETTE)
+        surface.set_colorkey(CELL_PATH)  # Open cells are transparent
+        return surface
+
+    def render(self, cells, water=None, path=None, tile_size=None):
+        """
+        Return a Surface of the (height, width) `cells` array scaled to `tile_size`.
+
+        `water` is an optional boolean array of the same shape and `path` an
+        optional list of (x, y) cells, relative to the array, to mark in GREEN.
+        """
+        tile_size = tile_size or TILE_SIZE
+        height, width = cells.shape
+        if self.surface is None or self.surface.get_size() != (width, height):
+            self.surface = self._palettized((width, height))
+        scaled_size = (width * tile_size, height * tile_size)
+        if self.scaled is None or self.scaled.get_size() != scaled_size:
+            self.scaled = self._palettized(scaled_size)
+
+        pixels = cells if water is None else numpy.where(water, PALETTE_WATER, cells)
+        if path:
+            pixels = pixels.astype(numpy.uint8)  # Copy so the maze itself is untouched
+            xs, ys = zip(*path)
+            pixels[list(ys), list(xs)] = PALETTE_PATH
+        pygame.surfarray.blit_array(self.surface, pixels.T)
+        return pygame.transform.scale(self.surface, scaled_size, self.scaled)
+
+# Palette layer shared by the surfarray render backend
+palette_layer = PaletteLayer()
 
 # Draw the maze game 
-def draw_maze(screen, maze, water_grid=None, path=None):
-    if custom_background_image:
-        screen.blit(custom_background_image, (0, 0))
+def draw_maze(screen, maze, water_grid=None, path=None, view=None):
+    """
+    Draw the maze, its water and a path onto the screen.
+
+    Args:
+        view: (x0, y0, x1, y1) window of cells to draw, with cell (x0, y0) at the
+            top left of the screen. Cells outside it are skipped (default: all).
+    """
+    background = background_image(screen)
+    if background:
+        screen.blit(background, (0, 0))
     else:
         screen.fill(WHITE)
 
-    for y, row in enumerate(maze):
-        for x, cell in enumerate(row):
-            if water_grid and water_grid[y][x]:
-                color = LIGHT_BLUE  # Water-occupied cell
-            elif cell == '#':
-                color = BLACK
-            elif cell == 'E':
-                color = RED
-            else:
-                color = WHITE
-            
-            # if not WHITE, display
-            if color != WHITE:
-                pygame.draw.rect(screen, color, (x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE))
+    x0, y0, x1, y1 = view or (0, 0, maze.width, maze.height)
+    cells = maze.array[y0:y1, x0:x1]
+    water = water_grid.array[y0:y1, x0:x1] if water_grid is not None else None
+    if path:
+        path = [(x - x0, y - y0) for x, y in path if x0 <= x < x1 and y0 <= y < y1]
+
+    if RENDER_BACKEND == 'surfarray':
+        # Write the visible cells as one pixel each and blit them in a single scaled image
+        screen.blit(palette_layer.render(cells, water, path), (0, 0))
+        return
+
+    # Only walls, the exit and water-occupied cells are drawn, open cells stay WHITE
+    # (or show the background). Water is drawn last so it covers the exit.
+    layers = [(BLACK, cells == CELL_WALL), (RED, cells == CELL_EXIT)]
+    if water is not None:
+        layers.append((LIGHT_BLUE, water))
+    for color, mask in layers:
+        ys, xs = numpy.nonzero(mask)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            pygame.draw.rect(screen, color, (x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE))
 
     if path:
         for x, y in path:
             pygame.draw.rect(screen, GREEN, (x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE))
 
-# Check if the player encounters the water
-def check_player_collision(player_pos, water_grid):
-    """Check if the player has collided with water."""
-    x, y = player_pos
-    if water_grid[y][x]:
-        return True
-    return False
-
-# Water speed schedule
-def water_speed_schedule(water_parameters, round_num):
-    # Calculate next water_speed
-    if water_parameters is not None:
-        water_parameters['normal'] = WATER_SPREAD_RATE_NORMAL * numpy.log(numpy.exp(1) + round_num)
-        water_parameters['downward'] = WATER_SPREAD_RATE_DOWNWARD * numpy.log(numpy.exp(1) + round_num)
-    return water_parameters
-    
+# Camera over a board larger than the window
+class Camera:
+    """
+    The window of cells shown on screen, as whole cells from (x, y).
+
+    While `following`, the view scrolls to keep the player at least
+    CAMERA_MARGIN cells from its edges. Panning with the mouse stops following
+    until the player moves again. Boards that fit the window never scroll.
+    """
+    def __init__(self, maze_width, maze_height, view_width, view_height, tile_size):
+        self.maze_size = (maze_width, maze_height)
+        self.tile_size = tile_size
+        self.columns = max(1, min(maze_width, view_width // tile_size))
+        self.rows = max(1, min(maze_height, view_height // tile_size))
+        self.x = 0
+        self.y = 0
+        self.following = True
+        self.drag_pixels = [0, 0]  # Mouse motion not yet turned into whole cells
+
+    def matches(self, maze, tile_size):
+        return self.maze_size == (maze.width, maze.height) and self.tile_size == tile_size
+
+    def view(self):
+        return (self.x, self.y, self.x + self.columns, self.y + self.rows)
+
+    def move_to(self, x, y):
+        self.x = max(0, min(x, self.maze_size[0] - self.columns))
+        self.y = max(0, min(y, self.maze_size[1] - self.rows))
+
+    def follow(self, player_pos):
+        if not self.following:
+            return
+        x, y = self.x, self.y
+        margin_x = min(CAMERA_MARGIN, (self.columns - 1) // 2)
+        margin_y = min(CAMERA_MARGIN, (self.rows - 1) // 2)
+        if player_pos[0] < x + margin_x:
+            x = player_pos[0] - margin_x
+        elif player_pos[0] >= x + self.columns - margin_x:
+            x = player_pos[0] - self.columns + margin_x + 1
+        if player_pos[1] < y + margin_y:
+            y = player_pos[1] - margin_y
+        elif player_pos[1] >= y + self.rows - margin_y:
+            y = player_pos[1] - self.rows + margin_y + 1
+        self.move_to(x, y)
+
+    def pan(self, cells_x, cells_y):
+        self.following = False
+        self.move_to(self.x + cells_x, self.y + cells_y)
+
+    def drag(self, dx, dy):
+        """Pan with the board following a mouse that moved by (dx, dy) pixels."""
+        self.drag_pixels[0] -= dx
+        self.drag_pixels[1] -= dy
+        cells_x = int(self.drag_pixels[0] / self.tile_size)
+        cells_y = int(self.drag_pixels[1] / self.tile_size)
+        self.drag_pixels[0] -= cells_x * self.tile_size
+        self.drag_pixels[1] -= cells_y * self.tile_size
+        self.pan(cells_x, cells_y)
+
+    def to_cell(self, mouse_x, mouse_y):
+        """Return the (x, y) cell under a screen position, or None outside the view."""
+        column, row = mouse_x // self.tile_size, mouse_y // self.tile_size
+        if 0 <= column < self.columns and 0 <= row < self.rows:
+            return (self.x + column, self.y + row)
+        return None
+
+# Maze renderer with a cached static layer
+class MazeRenderer:
+    """
+    Draws the maze game and reports the rects that changed.
+
+    Only the camera's window of cells is drawn. The background, walls and exit
+    of that window are pre-rendered into `static`, and `board` is the static
+    layer plus the water drawn so far. Each frame only the newly flooded cells
+    are painted onto the board, the screen is restored from the board under last
+    frame's player and path, and the player is drawn at its new tile. When the
+    camera moves, the layers are rendered again for the new window, so the cost
+    depends on the window size and not on the maze size. `draw` returns the
+    dirty rects to pass to pygame.display.update. A new renderer is needed when
+    the maze, water grid, camera, TILE_SIZE, background or window size changes
+    (see `matches`).
+    """
+    def __init__(self, screen, maze, water_grid, camera):
+        self.maze = maze
+        self.water_grid = water_grid
+        self.camera = camera
+        self.tile_size = TILE_SIZE
+        self.size = screen.get_size()
+        self.background = background_image(screen)
+
+        self.static = pygame.Surface(self.size)
+        self.board = pygame.Surface(self.size)
+        self.view = None
+        self.overlay = []  # Rects drawn over the board in the last frame
+        self.full_redraw = True
+        self.redrawn = False  # Whether the last frame repainted the whole screen
+
+    def matches(self, screen, maze, water_grid, camera):
+        return (self.maze is maze and self.water_grid is water_grid and self.camera is camera and
+                self.tile_size == TILE_SIZE and self.size == screen.get_size() and
+                self.background is background_image(screen))
+
+    def invalidate(self):
+        """Repaint the whole board on the next frame, e.g. after a notification."""
+        self.full_redraw = True
+
+    def set_view(self, view):
+        """Render the static layer of a window of cells; its water is painted again by `draw`."""
+        x0, y0, x1, y1 = self.view = view
+        self.static.fill(WHITE)
+        draw_maze(self.static, self.maze, view=view)
+        self.board.blit(self.static, (0, 0))
+        self.water_drawn = numpy.zeros((y1 - y0, x1 - x0), dtype=numpy.bool_)
+        self.dry_cells = self.maze.array[y0:y1, x0:x1] != CELL_EXIT  # The exit stays red under water
+        self.full_redraw = True
+
+    def draw(self, screen, player_pos, path=None, from_pos=None, alpha=1.0):
+        """
+        Draw a frame and return its dirty rects. With `from_pos`, the player is
+        drawn `alpha` of the way from there to `player_pos`, between two ticks.
+        """
+        if self.camera.view() != self.view:
+            self.set_view(self.camera.view())
+        x0, y0, x1, y1 = self.view
+        tile = self.tile_size
+        dirty = []
+
+        # Paint the newly flooded cells of the window onto the board
+        new_water = self.water_grid.array[y0:y1, x0:x1] & ~self.water_drawn & self.dry_cells
+        ys, xs = numpy.nonzero(new_water)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            rect = pygame.Rect(x * tile, y * tile, tile, tile)
+            self.board.fill(LIGHT_BLUE, rect)
+            dirty.append(rect)
+        self.water_drawn |= new_water
+
+        # Bring the board to the screen where it changed or was drawn over
+        self.redrawn = self.full_redraw
+        if self.full_redraw:
+            screen.blit(self.board, (0, 0))
+            dirty = [pygame.Rect((0, 0), self.size)]
+            self.full_redraw = False
+        else:
+            dirty += self.overlay
+            for rect in dirty:
+                screen.blit(self.board, rect, rect)
+
+        # Draw the path and the player on top, where they are in the window
+        self.overlay = []
+        for x, y in path or ():
+            if x0 <= x < x1 and y0 <= y < y1:
+                rect = pygame.Rect((x - x0) * tile, (y - y0) * tile, tile, tile)
+                screen.fill(GREEN, rect)
+                self.overlay.append(rect)
+        px, py = player_pos
+        if from_pos is not None and alpha < 1.0:
+            px = from_pos[0] + (px - from_pos[0]) * alpha
+            py = from_pos[1] + (py - from_pos[1]) * alpha
+        if x0 - 1 < px < x1 and y0 - 1 < py < y1:
+            rect = pygame.Rect(round((px - x0) * tile), round((py - y0) * tile), tile, tile)
+            image = player_image()
+            if image:
+                rect = screen.blit(image, rect)
+            else:
+                screen.fill(BLUE, rect)
+            self.overlay.append(rect)
+        return dirty + self.overlay
+
+# Text of the profiler overlay, rendered again every few frames
+_overlay_lines = []
+_overlay_frame = 0
+
+# Function to draw the frame profiler overlay in the top right corner
+def draw_profiler_overlay(screen, renderer, profiler):
+    """Draw the stage percentiles over the board and return the rect drawn."""
+    global _overlay_lines, _overlay_frame
+    if _overlay_frame % 30 == 0:
+        font = get_font(20)
+        rows = ["%-8s %6s %6s %6s" % ("ms", "p50", "p95", "p99")]
+        for name, (p50, p95, p99) in profiler.percentiles():
+            rows.append("%-8s %6.2f %6.2f %6.2f" % (name, p50, p95, p99))
+        _overlay_lines = [font.render(row, True, WHITE) for row in rows]
+    _overlay_frame += 1
+
+    width = max([line.get_width() for line in _overlay_lines] + [1]) + 10
+    rect = pygame.Rect(screen.get_width() - width - 5, 5, width, 16 * len(_overlay_lines) + 10)
+    screen.blit(renderer.board, rect, rect)  # Clear last frame's text
+    overlay = pygame.Surface(rect.size)
+    overlay.set_alpha(190)
+    screen.blit(overlay, rect)
+    for i, line in enumerate(_overlay_lines):
+        screen.blit(line, (rect.x + 5, rect.y + 5 + 16 * i))
+    return rect
+
+# Function to continue a loaded game in a new round state
+def restore_round(state, loaded_data):
+    player_pos, maze, current_seed, elapsed_time, loaded_difficulty, loaded_water_grid, loaded_water_queue, loaded_water_parameters = loaded_data
+    restored = RoundState(maze, loaded_water_parameters['round_count'], state.rng, state.flood_mode)
+    restored.water_time = state.water_time  # Change the water_time as the elapsed_time
+    restored.restore(player_pos, elapsed_time, loaded_water_grid, loaded_water_queue, loaded_water_parameters)
+    if replay_recorder is not None:
+        replay_recorder.start_round(current_seed, loaded_difficulty, restored, loaded=True)
+    return restored
+
 # Main function to play the game
-def play_maze(maze_width, maze_height, move_range, seed=None, *, loaded_data=None):
-    global TILE_SIZE, resume_play, water_grid, start_time, difficulty_level
+def play_maze(maze_width, maze_height, move_range, seed=None, *, loaded_data=None, max_frames=None,
+              tiled_maze=None, fast_forward=False):
+    """
+    Play rounds of the maze until the window is closed.
+
+    Args:
+        max_frames: stop and return after this many frames (None to play forever).
+        tiled_maze: play every round on this giant maze (see maze_tiles) instead
+            of generating one per round.
+        fast_forward: run one tick per frame without waiting for real time, so
+            a headless game runs as fast as the CPU allows.
+    """
+    global TILE_SIZE, resume_play, start_time, difficulty_level
     accumulate_time = time.time()  # acuumulate time
     start_time = time.time()       # round start time
     round_count = 0
+    frame_count = 0
+    pending_load = None  # Future of a save file being read in the background
+    next_seed = None  # Seed of the round being prepared in the background
     
     while True:  # Loop to automatically transition to the next game after winning
         if seed is not None:
@@ -687,33 +658,60 @@ def play_maze(maze_width, maze_height, move_range, seed=None, *, loaded_data=Non
         # Reset start_time
         start_time = time.time()
         
-        # Generate maze
-        maze = generate_maze(maze_width, maze_height, seed, difficulty_level)
-        screen_width = maze_width * TILE_SIZE
-        screen_height = maze_height * TILE_SIZE + 60  # Additional space for buttons
-        screen = pygame.display.set_mode((screen_width, screen_height))
+        # Take the maze prepared during the last round, or generate it now (with a
+        # drawn seed if none was given, so the round can be replayed)
+        if seed is not None:
+            round_seed = seed
+        elif next_seed is not None:
+            round_seed = next_seed
+        else:
+            round_seed = random.randrange(1 << 31)
+        # Seeded sessions replay the same boards, so only they use the maze cache
+        cache_dir = MAZE_CACHE_DIR if seed is not None else None
+        if tiled_maze is not None:
+            state = tiled_round(tiled_maze, round_count, RandomStream(round_seed))
+        else:
+            state = round_prefetcher.take(maze_width, maze_height, round_seed, difficulty_level, round_count,
+                                          WATER_FLOOD_MODE, cache_dir)
+        maze = state.maze
+        
+        # Start preparing the next round while this one is played
+        next_seed = seed + 11 if seed is not None else random.randrange(1 << 31)
+        if tiled_maze is None:
+            round_prefetcher.start(maze_width, maze_height, next_seed, difficulty_level, round_count + 1,
+                                   WATER_FLOOD_MODE, cache_dir)
+        
+        # Only recreate the window if its size changes (boards larger than MAX_VIEW_SIZE scroll)
+        screen_width = min(maze_width, MAX_VIEW_SIZE[0] // TILE_SIZE) * TILE_SIZE
+        screen_height = min(maze_height, MAX_VIEW_SIZE[1] // TILE_SIZE) * TILE_SIZE + 60  # Additional space for buttons
+        screen = pygame.display.get_surface()
+        if screen is None or screen.get_size() != (screen_width, screen_height):
+            screen = pygame.display.set_mode((screen_width, screen_height))
         pygame.display.set_caption("Maze Game with Enhanced Features")
         
         # Clock and other parameters
         clock = pygame.time.Clock()
-        player_pos = [1, 1]
-        end_pos = (maze_width - 2, maze_height - 2)
         dragging = False  # Track whether the player is being dragged
+        panning = False   # Track whether the view is being dragged
+        camera = None
+
+        # The save, load, and settings buttons, drawn again only when hovered or after the board was repainted
+        buttons = Panel()
+        save_button = buttons.add(Button("Save", (10, screen_height - 50, 80, 40), GRAY, HOVER_GRAY))
+        load_button = buttons.add(Button("Load", (100, screen_height - 50, 80, 40), GRAY, HOVER_GRAY))
+        settings_button = buttons.add(Button("Settings", (190, screen_height - 50, 120, 40), GRAY, HOVER_GRAY))
+        reach = ReachCache()  # Cells within the move range, searched again only after the player moves
         
-        # Initialize water structures but do NOT initialize water deque
-        water_time = 0
-        water_grid = initialize_water_grid(maze_width, maze_height)
-        water_queue = deque()
-        water_parameters = {'elapsed': 0, 
-                            'normal' : WATER_SPREAD_RATE_NORMAL,
-                            'downward': WATER_SPREAD_RATE_DOWNWARD,
-                            'round_count': round_count}
-        water_parameters = water_speed_schedule(water_parameters, round_count)
-        water_initial_place = (1, 1)
+        # The player and water structures, with a flood generator seeded by the round
+        player_pos = state.player_pos
+        renderer = None
+        if replay_recorder is not None:
+            replay_recorder.start_round(round_seed, difficulty_level, state)
         
-        # Initialize the global timer
+        # Initialize the global timer, and the clock turning its time into simulation ticks
         global_timer = Timer()
         global_timer.update()
+        tick_clock = TickClock()
         
         # If loaded_data is not None, meaning having loaded from the welcome page
         if loaded_data is not None:
@@ -737,212 +735,294 @@ def play_maze(maze_width, maze_height, move_range, seed=None, *, loaded_data=Non
                 if global_timer.is_paused() == True:
                     global_timer.resume()
             
-            # Update water spread
+            # Run the simulation (flood, player moves, win and flood checks) in fixed ticks
+            frame_profiler.begin_frame()
             global_timer.update()
-            delta_time = global_timer.get_delta_time()
-            water_time += delta_time
-            
-            # This is the delayed water appearance
-            if water_time > WATER_SPREAD_DELAY:
-                if len(water_queue) == 0:
-                    initialize_water(water_grid, water_queue, water_initial_place)
-                else:
-                    update_water(maze, water_grid, water_queue, delta_time, water_parameters)
+            ticks = 1 if fast_forward else tick_clock.ticks(global_timer.get_delta_time())
+            for _ in range(ticks):
+                delta_time = TICK_SECONDS
+                if replay_recorder is not None:
+                    delta_time = replay_recorder.step(delta_time)
+                state.tick(delta_time)
+                if replay_recorder is not None:
+                    replay_recorder.end_tick(state)
+                if state.outcome is not None:
+                    break
+            frame_profiler.mark("ticks")
             
+            # Take a save file once the worker has read it
+            if pending_load is not None and pending_load.done():
+                loaded_data = finish_load(pending_load)
+                pending_load = None
+
             # Handling loaded_data passed in
             if loaded_data:
-                player_pos, maze, current_seed, elapsed_time, loaded_difficulty, loaded_water_grid, loaded_water_queue, loaded_water_parameters = loaded_data
-                difficulty_level = loaded_difficulty
-                start_time = time.time() - elapsed_time  # Resume the saved time
-                # Reinitialize water structures based on loaded maze
-                water_grid = loaded_water_grid
-                water_queue = loaded_water_queue
-                water_parameters = loaded_water_parameters
-                round_count = water_parameters['round_count']
-                # Change the water_time as the elapsed_time
-                water_time = water_time + elapsed_time
+                state = restore_round(state, loaded_data)
+                maze, player_pos, round_count = state.maze, state.player_pos, state.round_count
+                difficulty_level = loaded_data[4]
+                start_time = time.time() - loaded_data[3]  # Resume the saved time
                 # Restore
                 loaded_data = None
             
-            # Draw maze
-            move_range = adjust_move_range(maze, player_pos)
-            screen.fill(WHITE)
-            draw_maze(screen, maze, water_grid=water_grid, path = None) # do not provide navigation now
+            # Fit the camera to the board area of the window (again after a load or a tile size change)
+            if camera is None or not camera.matches(maze, TILE_SIZE):
+                camera = Camera(maze.width, maze.height, screen_width, screen_height - 60, TILE_SIZE)
+            camera.follow(player_pos)
+
+            # Preview the path to the reachable cell under the mouse (not while walking a clicked path)
+            preview = None
+            if HOVER_PREVIEW and not dragging and not panning and not state.walking():
+                cell = camera.to_cell(*pygame.mouse.get_pos())
+                if cell is not None:
+                    preview = reach.update(maze, player_pos).path_to(*cell)
             
-            # Draw the save, load, and settings buttons
-            save_button_rect = pygame.Rect(10, screen_height - 50, 80, 40)
-            load_button_rect = pygame.Rect(100, screen_height - 50, 80, 40)
-            settings_button_rect = pygame.Rect(190, screen_height - 50, 120, 40)
-
-            save_button = create_button(screen, "Save", 10, screen_height - 50, 80, 40, GRAY, (180, 180, 180))
-            load_button = create_button(screen, "Load", 100, screen_height - 50, 80, 40, GRAY, (180, 180, 180))
-            settings_button = create_button(screen, "Settings", 190, screen_height - 50, 120, 40, GRAY, (180, 180, 180))
-
-            # Draw the player and the end position
-            pygame.draw.rect(screen, RED, (end_pos[0] * TILE_SIZE, end_pos[1] * TILE_SIZE, TILE_SIZE, TILE_SIZE))
-            if custom_player_image:
-                screen.blit(custom_player_image, (player_pos[0] * TILE_SIZE, player_pos[1] * TILE_SIZE))
-            else:
-                pygame.draw.rect(screen, BLUE, (player_pos[0] * TILE_SIZE, player_pos[1] * TILE_SIZE, TILE_SIZE, TILE_SIZE))
+            # Draw maze, the end position and the player (only what changed, and all of it
+            # where a notification went away)
+            if renderer is None or not renderer.matches(screen, maze, state.water_grid, camera):
+                renderer = MazeRenderer(screen, maze, state.water_grid, camera)
+            if notifications.update():
+                renderer.invalidate()
+            alpha = 1.0 if fast_forward else tick_clock.alpha()
+            dirty_rects = renderer.draw(screen, player_pos, path=preview, from_pos=state.previous_pos, alpha=alpha)
+            frame_profiler.mark("draw")
+            
+            # Draw the buttons that changed (all of them if the board covered them)
+            if renderer.redrawn:
+                buttons.invalidate()
+            dirty_rects += buttons.draw(screen)
+            dirty_rects += notifications.draw(screen)
+            frame_profiler.mark("buttons")
                 
             # Handling events
             for event in pygame.event.get():
+                clicked = buttons.handle_event(event)  # Hover changes, and the button clicked if any
                 if event.type == pygame.QUIT:
                     pygame.quit()
                     exit()
 
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    # Toggle the profiler overlay (a --trace timeline goes on either way)
+                    frame_profiler.show(not frame_profiler.visible)
+                    renderer.invalidate()
+
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                    camera.following = True  # Bring the view back to the player
+
+                elif event.type == pygame.MOUSEWHEEL:
+                    # Scroll the view, sideways with shift held
+                    if pygame.key.get_mods() & pygame.KMOD_SHIFT:
+                        camera.pan(-event.y * SCROLL_CELLS, 0)
+                    else:
+                        camera.pan(event.x * SCROLL_CELLS, -event.y * SCROLL_CELLS)
+
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button != pygame.BUTTON_LEFT:
+                    # The right or middle button drags the view (wheel notches arrive as MOUSEWHEEL too)
+                    panning = event.button in (pygame.BUTTON_MIDDLE, pygame.BUTTON_RIGHT)
+
+                elif event.type == pygame.MOUSEMOTION and panning:
+                    camera.drag(*event.rel)
+
                 elif event.type == pygame.MOUSEBUTTONDOWN:
-                    mouse_x, mouse_y = pygame.mouse.get_pos()
+                    mouse_x, mouse_y = event.pos
 
                    # Check if the save button is clicked
-                    if save_button_rect.collidepoint(mouse_x, mouse_y):
-                        # Resume and save
-                        resume_play = True
+                    if clicked is save_button:
+                        # Stop the clock during the dialog; the file is written in the background
                         global_timer.pause()
-                        save_game_state(player_pos, maze, seed, start_time, difficulty_level, water_grid, water_queue, water_parameters)
+                        save_game_state(player_pos, maze, seed, start_time, difficulty_level, *state.water_state())
+                        renderer.invalidate()
                 
                     # Check if the load button is clicked
-                    elif load_button_rect.collidepoint(mouse_x, mouse_y):
-                        # Resume and load
-                        resume_play = True
+                    elif clicked is load_button:
+                        # Stop the clock during the dialog; the round continues once the file is read
                         global_timer.pause()
-                        loaded_data = load_game_state()
-                        if loaded_data:
-                            player_pos, maze, current_seed, elapsed_time, loaded_difficulty, loaded_water_grid, loaded_water_queue, loaded_water_parameters = loaded_data
-                            difficulty_level = loaded_difficulty
-                            start_time = time.time() - elapsed_time  # Resume the saved time
-                            # Reinitialize water structures based on loaded maze
-                            water_grid = loaded_water_grid
-                            water_queue = loaded_water_queue
-                            water_parameters = loaded_water_parameters
-                            round_count = water_parameters['round_count']
-                            # Change the water_time as the elapsed_time
-                            water_time = water_time + elapsed_time
-                            # Restore
-                            loaded_data = None
-                            break  # Reload the maze with loaded data
+                        pending_load = load_game_state() or pending_load
+                        renderer.invalidate()
 
                     # Check if the settings button is clicked
-                    elif settings_button_rect.collidepoint(mouse_x, mouse_y):
+                    elif clicked is settings_button:
                         # Resume and setting
                         resume_play = True
                         global_timer.pause()
                         show_settings_screen(screen)  # Open the settings screen
+                        renderer.invalidate()
 
                     else:
-                        grid_x = mouse_x // TILE_SIZE
-                        grid_y = mouse_y // TILE_SIZE
+                        cell = camera.to_cell(mouse_x, mouse_y)
 
-                        # Ensure grid_x and grid_y are within maze bounds
-                        if 0 <= grid_x < maze_width and 0 <= grid_y < maze_height:
+                        # Ensure the click is on the board
+                        if cell is not None:
+                            grid_x, grid_y = cell
+                            camera.following = True
                             if [grid_x, grid_y] == player_pos:
                                 dragging = True
-                            elif maze[grid_y][grid_x] in (' ', 'E'):  # Click-to-move functionality
-                                path = find_path_within_range(maze, tuple(player_pos), (grid_x, grid_y), move_range)
+                            elif maze.get(grid_x, grid_y) != CELL_WALL:  # Click-to-move functionality
+                                path = reach.update(maze, player_pos).path_to(grid_x, grid_y)
                                 if path:
-                                    animate_movement(screen, clock, maze, player_pos, path)
-                                    if [grid_x, grid_y] == end_pos:
-                                        show_notification(screen, "Congratulations! You reached the end!", 2000)
-                                        running = False  # End current game to start a new game
+                                    state.walk(path)  # Walked a cell per tick, drawn between ticks
 
                 elif event.type == pygame.MOUSEBUTTONUP:
                     dragging = False  # Stop dragging when the mouse button is released
+                    panning = False
+
+            frame_profiler.mark("events")
 
             # Handling dragging
             if dragging:
-                mouse_x, mouse_y = pygame.mouse.get_pos()
-                grid_x = mouse_x // TILE_SIZE
-                grid_y = mouse_y // TILE_SIZE
+                cell = camera.to_cell(*pygame.mouse.get_pos())
 
-                # Ensure grid_x and grid_y are within maze bounds
-                if 0 <= grid_x < maze_width and 0 <= grid_y < maze_height:
-                    if maze[grid_y][grid_x] == '#':
+                # Ensure the mouse is on the board (the view scrolls as the player nears its edge)
+                if cell is not None:
+                    grid_x, grid_y = cell
+                    if maze.get(grid_x, grid_y) == CELL_WALL:
                         dragging = False  # Stop dragging if the mouse moves over a wall
-                    elif maze[grid_y][grid_x] in (' ', 'E'):
-                        player_pos[0], player_pos[1] = grid_x, grid_y
-                        if [grid_x, grid_y] == end_pos:
-                            show_notification(screen, "Congratulations! You reached the end!", 2000)
-                            running = False
-
-            # Check if player reached the end
-            if player_pos == list(end_pos):
-                show_notification(screen, "Congratulations! You reached the end!", 2000)
+                    elif [grid_x, grid_y] != player_pos:
+                        state.queue_move(grid_x, grid_y)  # Made on the next tick
+
+            # Check if a tick ended the round: the player reached the end
+            if state.outcome == 'won':
+                notifications.post("Congratulations! You reached the end!", 2000)  # Shown over the next round
                 running = False
+                if replay_recorder is not None:
+                    replay_recorder.end_round('won')
                 
-            # Inside the main game loop after updating player_pos
-            if check_player_collision(player_pos, water_grid):
-                show_notification(screen, "Game Over! You were flooded by water.", 2000)
+            # Or the player was flooded
+            elif state.outcome == 'flooded':
+                notifications.post("Game Over! You were flooded by water.", 2000)
                 round_count = 0  # Reset Round Counter
                 running = False  # End the current game
+                if replay_recorder is not None:
+                    replay_recorder.end_round('flooded')
+
+            frame_profiler.mark("checks")
+            if frame_profiler.visible:
+                dirty_rects.append(draw_profiler_overlay(screen, renderer, frame_profiler))
 
             # Display change
-            pygame.display.flip()
+            pygame.display.update(dirty_rects)
+            frame_profiler.mark("display")
             # Pause to achieve 60 FPS
-            clock.tick(FPS)
+            clock.tick(0 if fast_forward else FPS)
+            frame_profiler.mark("wait")
+            frame_profiler.end_frame()
+            
+            # Stop after a fixed number of frames, e.g. in headless runs
+            frame_count += 1
+            if max_frames is not None and frame_count >= max_frames:
+                return
 
 # Welcome screen with buttons and input prompts
 def show_welcome_screen(screen):
     global resume_play
     
-    font = pygame.font.Font(None, 48)
-    screen.fill(WHITE)
-    if custom_background_image:
-        screen.blit(custom_background_image, (0, 0))
-    title = font.render("Welcome to the Maze Game", True, BLACK)
-    screen.blit(title, (50, 50))
-
-    # Button rectangles for click detection
-    start_button_rect = pygame.Rect(50, 150, 200, 50)
-    settings_button_rect = pygame.Rect(50, 220, 200, 50)
-    load_button_rect = pygame.Rect(50, 290, 200, 50)
+    # The title and buttons, drawn again only when hovered or after another screen
+    panel = Panel(background=draw_menu_background)
+    panel.add(Label("Welcome to the Maze Game", (50, 50), 48))
+    start_button = panel.add(Button("Start Game", (50, 150, 200, 50), GREEN, (0, 200, 0)))
+    settings_button = panel.add(Button("Settings", (50, 220, 200, 50), BLUE, (0, 0, 200)))
+    load_button = panel.add(Button("Load Game", (50, 290, 200, 50), RED, (200, 0, 0)))
     
     clock = pygame.time.Clock()
+    pending_load = None  # Future of a save file being read in the background
 
     while True:
-        screen.fill(WHITE)
-        if custom_background_image:
-            screen.blit(custom_background_image, (0, 0))
-        screen.blit(title, (50, 50))
-
-        # Draw the buttons
-        create_button(screen, "Start Game", 50, 150, 200, 50, GREEN, (0, 200, 0))
-        create_button(screen, "Settings", 50, 220, 200, 50, BLUE, (0, 0, 200))
-        create_button(screen, "Load Game", 50, 290, 200, 50, RED, (200, 0, 0))
+        # Continue a loaded game once the worker has read it
+        if pending_load is not None and pending_load.done():
+            loaded_data = finish_load(pending_load)
+            pending_load = None
+            if loaded_data:
+                # Resume and load
+                resume_play = True
+                # Try to unpack
+                player_pos, maze, current_seed, elapsed_time, loaded_difficulty, loaded_water_grid, loaded_water_queue, loaded_water_parameters = loaded_data
+                # Pass in the loaded data
+                play_maze(maze.width, maze.height, DEFAULT_MOVE_RANGE, current_seed,
+                          loaded_data=loaded_data)
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
 
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                mouse_x, mouse_y = pygame.mouse.get_pos()
+            clicked = panel.handle_event(event)
+            if clicked is None:
+                continue
+            panel.invalidate()  # The game, settings and dialogs draw over the screen
 
-                # Check if the buttons are clicked
-                if start_button_rect.collidepoint(mouse_x, mouse_y):
-                    seed_input = show_input_box(screen, "Enter seed (digits only, or leave blank):", 50, 350, 300, 50, digit_only=True)
-                    current_seed = int(seed_input) if seed_input else None
-                    play_maze(DEFAULT_MAZE_WIDTH, DEFAULT_MAZE_HEIGHT, DEFAULT_MOVE_RANGE, current_seed)
+            # Check if the buttons are clicked
+            if clicked is start_button:
+                seed_input = show_input_box(screen, "Enter seed (digits only, or leave blank):", 50, 350, 300, 50, digit_only=True)
+                current_seed = int(seed_input) if seed_input else None
+                play_maze(DEFAULT_MAZE_WIDTH, DEFAULT_MAZE_HEIGHT, DEFAULT_MOVE_RANGE, current_seed)
 
-                elif settings_button_rect.collidepoint(mouse_x, mouse_y):
-                    show_settings_screen(screen)
+            elif clicked is settings_button:
+                show_settings_screen(screen)
 
-                elif load_button_rect.collidepoint(mouse_x, mouse_y):
-                    loaded_data = load_game_state()
-                    if loaded_data:
-                        # Resume and load
-                        resume_play = True
-                        # Try to unpack
-                        player_pos, maze, current_seed, elapsed_time, loaded_difficulty, loaded_water_grid, loaded_water_queue, loaded_water_parameters = loaded_data
-                        # Pass in the loaded data
-                        play_maze(len(maze[0]), len(maze), DEFAULT_MOVE_RANGE, current_seed,
-                                  loaded_data=loaded_data)
-                    else:
-                        show_notification(screen, "No saved game found!", 1500)
+            elif clicked is load_button:
+                pending_load = load_game_state() or pending_load
 
-        pygame.display.flip()
+        # Show the notifications, drawing the screen again where one went away
+        if notifications.update():
+            panel.invalidate()
+        pygame.display.update(panel.draw(screen) + notifications.draw(screen))
         clock.tick(FPS)
 
+# Function to parse the command line and run the game
+def main(argv=None):
+    """
+    Run the game. With --headless the game runs on SDL's dummy video and audio
+    drivers without a window, and skips the welcome screen.
+    """
+    global screen, replay_recorder, round_prefetcher
+    parser = argparse.ArgumentParser(description="Floating Maze")
+    parser.add_argument("--headless", action="store_true", help="run without a window (SDL dummy drivers)")
+    parser.add_argument("--seed", type=int, default=None, help="maze seed")
+    parser.add_argument("--width", type=int, default=DEFAULT_MAZE_WIDTH, help="maze width in cells")
+    parser.add_argument("--height", type=int, default=DEFAULT_MAZE_HEIGHT, help="maze height in cells")
+    parser.add_argument("--frames", type=int, default=None, help="quit after this many frames")
+    parser.add_argument("--record", default=None, help="record the run to this replay file (.amzr)")
+    parser.add_argument("--trace", default=None, help="write a Chrome trace of the frame stages to this file")
+    parser.add_argument("--fast-forward", action="store_true",
+                        help="run one tick per frame without waiting for real time")
+    parser.add_argument("--maze", default=None, help="play on this giant maze file (.amzt, see maze_tiles.py)")
+    args = parser.parse_args(argv)
+    if args.maze and args.record:
+        parser.error("--record replays mazes from their seed and cannot record a --maze file")
+
+    # The SDL drivers must be chosen before pygame is initialized
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+    pygame.init()
+    load_default_resources()
+
+    screen = pygame.display.set_mode((960, 640))  # Increased resolution for better GUI
+    pygame.display.set_caption("Maze Game")
+    round_prefetcher = RoundPrefetcher(PREFETCH_ROUNDS)
+    if args.record:
+        replay_recorder = ReplayRecorder()
+    if args.trace:
+        frame_profiler.start_trace()
+    try:
+        if args.maze:
+            tiled_maze = open_tiled_maze(args.maze)
+            play_maze(tiled_maze.width, tiled_maze.height, DEFAULT_MOVE_RANGE, args.seed, max_frames=args.frames,
+                      tiled_maze=tiled_maze, fast_forward=args.fast_forward)
+        elif args.headless or args.frames is not None:
+            play_maze(args.width, args.height, DEFAULT_MOVE_RANGE, args.seed, max_frames=args.frames,
+                      fast_forward=args.fast_forward)
+        else:
+            show_welcome_screen(screen)
+    finally:
+        # Also reached when the window is closed, which exits from inside the game
+        if replay_recorder is not None:
+            replay_recorder.save(args.record)
+        if args.trace:
+            frame_profiler.export_trace(args.trace)
+        round_prefetcher.shutdown()
+        save_worker.shutdown()  # Finish writing the saves still pending
+    pygame.quit()
+
 # Run the game
-screen = pygame.display.set_mode((960, 640))  # Increased resolution for better GUI
-pygame.display.set_caption("Maze Game")
-show_welcome_screen(screen)
+if __name__ == "__main__":
+    main()
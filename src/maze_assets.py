@@ -0,0 +1,83 @@
+'''
+Floating Maze - image asset cache
+Version 20241111
+Copyright: DOF Studio
+
+Images are registered by name with their file and only loaded on first use.
+The original is kept converted to the display's pixel format, and the scaled
+copies the game asks for (the player at the tile size, the background at the
+window size) are cached, the least recently used being dropped past a limit.
+Registering a new file for a name, e.g. after an upload, drops its copies.
+'''
+
+from collections import OrderedDict
+import pygame
+
+# Scaled copies kept across all images
+MAX_SCALED_VARIANTS = 8
+
+# Cache of the game's images
+class AssetCache:
+    """
+    Named images, loaded lazily and scaled on demand.
+
+    Args:
+        max_variants: scaled copies kept; the least recently used is dropped
+            when another is made.
+    """
+    def __init__(self, max_variants=MAX_SCALED_VARIANTS):
+        self.max_variants = max_variants
+        self.sources = {}             # Name -> image file
+        self.originals = {}           # Name -> (loaded image, whether it is converted)
+        self.variants = OrderedDict()  # (name, size) -> scaled image, least recently used first
+        self.loads = 0
+        self.scales = 0
+
+    def register(self, name, path):
+        """Use the image file `path` for `name` (None to have no image), dropping what was cached for it."""
+        if path is None:
+            self.sources.pop(name, None)
+        else:
+            self.sources[name] = path
+        self.invalidate(name)
+
+    def invalidate(self, name):
+        self.originals.pop(name, None)
+        for key in [key for key in self.variants if key[0] == name]:
+            del self.variants[key]
+
+    def original(self, name):
+        """
+        The image of `name` at its own size, or None if none is registered.
+        Raises pygame.error (or FileNotFoundError) if the file cannot be loaded.
+        """
+        if name not in self.sources:
+            return None
+        image, converted = self.originals.get(name, (None, False))
+        if image is None:
+            image = pygame.image.load(self.sources[name])
+            self.loads += 1
+        if not converted and pygame.display.get_surface() is not None:
+            # Blitting is fastest in the display's pixel format, which needs a window
+            image = image.convert_alpha() if image.get_flags() & pygame.SRCALPHA else image.convert()
+            converted = True
+        self.originals[name] = (image, converted)
+        return image
+
+    def get(self, name, size):
+        """The image of `name` scaled to `size`, or None if none is registered."""
+        key = (name, tuple(size))
+        image = self.variants.get(key)
+        if image is not None:
+            self.variants.move_to_end(key)
+            return image
+        original = self.original(name)
+        if original is None:
+            return None
+        image = pygame.transform.smoothscale(original, key[1])
+        self.scales += 1
+        if self.originals[name][1]:  # Copies made before there was a window are not kept unconverted
+            self.variants[key] = image
+            while len(self.variants) > self.max_variants:
+                self.variants.popitem(last=False)
+        return image
@@ -0,0 +1,183 @@
+'''
+Floating Maze - batch level generation
+Version 20241111
+Copyright: DOF Studio
+
+Generates mazes over ranges of seeds, board sizes and difficulties in a
+process pool, and streams statistics of every maze to a CSV file or to
+columnar .npz chunks while the batch runs.
+
+Usage: python maze_batch.py --seeds 0:1000 --sizes 57,101,56x42 --difficulties 0,32,100 --out stats.csv
+'''
+
+import os
+import csv
+import time
+import argparse
+import itertools
+import numpy
+from multiprocessing import Pool
+from maze_engine import (
+    CELL_WALL, DEFAULT_DIFFICULTY, WATER_SPREAD_DELAY, RandomStream, RoundState, generate_maze, find_solution_path
+)
+
+# Columns of the statistics, in output order
+STAT_COLUMNS = ("seed", "width", "height", "difficulty", "open_cells", "solution_length", "dead_ends",
+                "junctions", "branch_factor", "flood_time_to_exit", "generation_seconds")
+
+# Jobs handed to the process pool at a time, so a long batch is never all queued in memory
+BATCH_JOBS = 4096
+
+# Function to compute the statistics of a maze
+def maze_stats(maze, rng=None, flood=True):
+    """
+    Return a dict of statistics of a maze:
+        open_cells: cells that are not walls.
+        solution_length: cells on the walkable path from (1, 1) to the exit
+            (0 if there is none, as on even-sized boards reached by dragging).
+        dead_ends: open cells with a single open neighbour.
+        junctions: open cells with three or more open neighbours.
+        branch_factor: mean number of open neighbours of the open cells.
+        flood_time_to_exit: seconds from the start of round 1 until water
+            reaches the exit, with the flood drawing from `rng` (a RandomStream,
+            as left by generate_maze in a round; inf if never).
+    """
+    cells = maze.array != CELL_WALL
+    neighbours = numpy.zeros(cells.shape, dtype=numpy.int8)
+    neighbours[1:, :] += cells[:-1, :]
+    neighbours[:-1, :] += cells[1:, :]
+    neighbours[:, 1:] += cells[:, :-1]
+    neighbours[:, :-1] += cells[:, 1:]
+    degrees = neighbours[cells]
+    exit_pos = (maze.width - 2, maze.height - 2)
+
+    stats = {
+        "open_cells": int(cells.sum()),
+        "solution_length": len(find_solution_path(maze, (1, 1), exit_pos)),
+        "dead_ends": int(numpy.count_nonzero(degrees == 1)),
+        "junctions": int(numpy.count_nonzero(degrees >= 3)),
+        "branch_factor": float(degrees.mean()) if len(degrees) else 0.0,
+        "flood_time_to_exit": None
+    }
+    if flood:
+        # The flood a first round would get: it appears after the delay and is precomputed from there
+        state = RoundState(maze, 1, rng if rng is not None else RandomStream(), 'arrival')
+        state.prepare_flood()
+        stats["flood_time_to_exit"] = WATER_SPREAD_DELAY + float(state.prepared_flood[0].arrival_at(*exit_pos))
+    return stats
+
+# Function to generate one maze of a batch and compute its statistics
+def batch_job(job):
+    seed, width, height, difficulty, flood = job
+    start = time.perf_counter()
+    rng = RandomStream(seed)
+    maze = generate_maze(width, height, difficulty=difficulty, rng=rng)
+    elapsed = time.perf_counter() - start
+    stats = maze_stats(maze, rng, flood)
+    stats.update(seed=seed, width=width, height=height, difficulty=difficulty, generation_seconds=elapsed)
+    return stats
+
+# Writes rows as CSV
+class CSVWriter:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(STAT_COLUMNS)
+
+    def write(self, row):
+        self.writer.writerow([row[column] for column in STAT_COLUMNS])
+
+    def close(self):
+        self.file.close()
+
+# Writes rows as columnar .npz chunks
+class ColumnWriter:
+    """
+    Buffers up to `chunk_rows` rows and writes them as one .npz file with an
+    array per column (part-00000.npz, part-00001.npz, ... in `directory`).
+    """
+    def __init__(self, directory, chunk_rows=10000):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.rows = []
+        self.parts = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        columns = {}
+        for column in STAT_COLUMNS:
+            values = [row[column] for row in self.rows]
+            if column == "flood_time_to_exit":
+                values = [numpy.nan if value is None else value for value in values]
+            columns[column] = numpy.array(values)
+        numpy.savez_compressed(os.path.join(self.directory, "part-%05d.npz" % self.parts), **columns)
+        self.parts += 1
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+# Function to read the columnar chunks back as one array per column
+def read_columns(directory):
+    parts = sorted(name for name in os.listdir(directory) if name.endswith(".npz"))
+    chunks = [numpy.load(os.path.join(directory, name)) for name in parts]
+    return {column: numpy.concatenate([chunk[column] for chunk in chunks]) for column in STAT_COLUMNS}
+
+# Function to parse "A:B" or "A,B,C" into a list of ints
+def parse_ints(text):
+    if ":" in text:
+        start, stop = text.split(":")
+        return list(range(int(start), int(stop)))
+    return [int(value) for value in text.split(",")]
+
+# Function to parse "57,101,56x42" into (width, height) pairs
+def parse_sizes(text):
+    sizes = []
+    for size in text.split(","):
+        width, _, height = size.partition("x")
+        sizes.append((int(width), int(height or width)))
+    return sizes
+
+# Run a batch from the command line
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Floating Maze level packs and their statistics")
+    parser.add_argument("--seeds", default="0:100", help="seed range A:B or list A,B,C")
+    parser.add_argument("--sizes", default="57", help="board sizes, e.g. 57,101,56x42")
+    parser.add_argument("--difficulties", default=str(DEFAULT_DIFFICULTY), help="difficulty list, e.g. 0,32,100")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--out", default="maze_stats.csv", help="CSV file, or directory with --format npz")
+    parser.add_argument("--format", choices=("csv", "npz"), default="csv", help="output format")
+    parser.add_argument("--chunk-rows", type=int, default=10000, help="rows per .npz chunk")
+    parser.add_argument("--no-flood", action="store_true", help="skip the flood time-to-exit (faster)")
+    args = parser.parse_args(argv)
+
+    # Pool.imap queues every job it is given at once, so jobs are handed over in
+    # bounded batches; results are written as they arrive, in job order
+    jobs = ((seed, width, height, difficulty, not args.no_flood)
+            for (width, height), difficulty, seed in itertools.product(
+                parse_sizes(args.sizes), parse_ints(args.difficulties), parse_ints(args.seeds)))
+    writer = CSVWriter(args.out) if args.format == "csv" else ColumnWriter(args.out, args.chunk_rows)
+    start = time.perf_counter()
+    count = 0
+    try:
+        with Pool(args.workers) as pool:
+            while True:
+                batch = list(itertools.islice(jobs, BATCH_JOBS))
+                if not batch:
+                    break
+                for row in pool.imap(batch_job, batch, chunksize=8):
+                    writer.write(row)
+                    count += 1
+    finally:
+        writer.close()
+    print("%d mazes in %.1f s -> %s" % (count, time.perf_counter() - start, args.out))
+
+if __name__ == "__main__":
+    main()
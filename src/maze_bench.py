@@ -0,0 +1,261 @@
+'''
+Floating Maze - benchmark suite
+Version 20241111
+Copyright: DOF Studio
+
+Times maze generation, pathfinding, the flood, rendering (on SDL's dummy
+driver) and save/load with fixed seeds, and writes the results as JSON so runs
+can be compared. The mazes the other benchmarks run on are taken from the
+maze cache (see maze_cache), so a rerun does not generate them again.
+
+Usage: python maze_bench.py [--quick] [--only NAME] [--out results.json] [--compare baseline.json] [--no-cache]
+'''
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import importlib.util
+import numpy
+from maze_engine import (
+    DEFAULT_DIFFICULTY, FloodFrontier, RandomStream, generate_maze, find_solution_path, find_path_within_range,
+    add_dead_end_branches, initialize_water_grid, initialize_water, update_water, compute_flood_arrival,
+    pack_game_state, unpack_game_state, encode_game_state, decode_game_state
+)
+from maze_cache import DEFAULT_CACHE_DIR, MazeCache
+
+# Seed of every benchmark, so runs time the same work
+BENCH_SEED = 7
+
+# Board sizes of the full and the --quick suite
+BENCH_SIZES = (57, 201, 501, 1001)
+QUICK_SIZES = (57, 201)
+BENCH_DIFFICULTIES = (0, DEFAULT_DIFFICULTY, 100)
+
+# Maze cache the benchmark mazes are taken from, set by main() (None to generate them)
+bench_cache = None
+
+# Flooding a board frame by frame takes minutes past this size, so larger boards are skipped
+FLOOD_MAX_SIZE = 201
+
+# Function to time a callable
+def measure(function, repeat, setup=None):
+    """
+    Run `function` `repeat` times and return the list of times in seconds.
+    `setup`, if given, runs before each call and its result is passed in,
+    outside of the timing.
+    """
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        if setup is not None:
+            function(argument)
+        else:
+            function()
+        times.append(time.perf_counter() - start)
+    return times
+
+# Function to get the maze a benchmark runs on, from the maze cache if there is one
+def bench_maze(size, difficulty=DEFAULT_DIFFICULTY):
+    if bench_cache is not None:
+        return bench_cache.maze(size, size, BENCH_SEED, difficulty)[0]
+    return generate_maze(size, size, BENCH_SEED, difficulty)
+
+# Function to load the game module (its file name is not importable)
+def load_game_module():
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "maze-game.py")
+    spec = importlib.util.spec_from_file_location("maze_game", path)
+    game = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(game)
+    game.pygame.init()
+    return game
+
+# Benchmarks, each yielding (name, parameters, function, setup) cases
+def bench_generate(sizes):
+    for size in sizes:
+        for difficulty in BENCH_DIFFICULTIES:
+            yield ("generate_maze", {"size": size, "difficulty": difficulty},
+                   lambda size=size, difficulty=difficulty: generate_maze(size, size, BENCH_SEED, difficulty), None)
+
+def bench_pathfinding(sizes):
+    for size in sizes:
+        maze = bench_maze(size)
+        end = (size - 2, size - 2)
+        yield ("find_solution_path", {"size": size},
+               lambda maze=maze, end=end: find_solution_path(maze, (1, 1), end), None)
+
+        # Clicks around the start, as the game does each time the player moves
+        rng = random.Random(BENCH_SEED)
+        opens = [(x, y) for y in range(1, min(size, 40)) for x in range(1, min(size, 40)) if maze.is_open(x, y)]
+        clicks = [(rng.choice(opens), rng.choice(opens)) for _ in range(100)]
+        yield ("find_path_within_range", {"size": size, "clicks": len(clicks)},
+               lambda maze=maze, clicks=clicks: [find_path_within_range(maze, start, end, 24)
+                                                 for start, end in clicks], None)
+
+def bench_dead_ends(sizes):
+    for size in sizes:
+        perfect = bench_maze(size, 0)  # No dead ends added yet
+        solution = find_solution_path(perfect, (1, 1), (size - 2, size - 2))
+
+        def setup(perfect=perfect):
+            return perfect.copy(), RandomStream(BENCH_SEED)
+        yield ("add_dead_end_branches", {"size": size, "difficulty": 100},
+               lambda state, solution=solution: add_dead_end_branches(state[0], 100, solution, state[1]), setup)
+
+def bench_flood(sizes):
+    for size in sizes:
+        if size > FLOOD_MAX_SIZE:
+            continue
+        maze = bench_maze(size)
+
+        def setup(size=size):
+            water_grid = initialize_water_grid(size, size)
+            water_queue = FloodFrontier(size, size)
+            initialize_water(water_grid, water_queue, (1, 1))
+            parameters = {'elapsed': 0, 'normal': 6.0, 'downward': 14.0, 'round_count': 1}
+            return water_grid, water_queue, parameters, RandomStream(BENCH_SEED)
+
+        def flood(state, maze=maze):
+            water_grid, water_queue, parameters, rng = state
+            while len(water_queue):  # 60 FPS frames until no water can spread
+                update_water(maze, water_grid, water_queue, 1 / 60, parameters, rng)
+
+        def arrival(state, maze=maze):
+            water_grid, water_queue, parameters, rng = state
+            compute_flood_arrival(maze, water_grid, water_queue, parameters, rng)
+        yield ("update_water_to_saturation", {"size": size}, flood, setup)
+        yield ("compute_flood_arrival", {"size": size}, arrival, setup)
+
+def bench_render(sizes):
+    game = load_game_module()
+    for size in sizes:
+        maze = bench_maze(size)
+        water_grid = initialize_water_grid(size, size)
+        water_grid.array[:, :size // 2] = maze.array[:, :size // 2] != 0  # Half flooded
+        tile = max(1, min(game.DEFAULT_TILE_SIZE, 1000 // size))
+        screen = game.pygame.display.set_mode((size * tile, size * tile))
+        for backend in ("rects", "surfarray"):
+            def draw(screen=screen, maze=maze, water_grid=water_grid, tile=tile, backend=backend):
+                game.TILE_SIZE = tile
+                game.RENDER_BACKEND = backend
+                game.draw_maze(screen, maze, water_grid)
+            yield ("draw_maze", {"size": size, "tile": tile, "backend": backend}, draw, None)
+
+def bench_viewport(sizes):
+    game = load_game_module()
+    screen = game.pygame.display.set_mode((960, 700))
+    game.TILE_SIZE = game.DEFAULT_TILE_SIZE
+    for size in sizes:
+        maze = bench_maze(size)
+        water_grid = initialize_water_grid(size, size)
+        water_grid.array[:, :size // 2] = maze.array[:, :size // 2] != 0
+
+        def frames(screen=screen, maze=maze, water_grid=water_grid, size=size):
+            # 60 frames with the camera following a player walking diagonally, the worst case
+            camera = game.Camera(size, size, 960, 640, game.TILE_SIZE)
+            renderer = game.MazeRenderer(screen, maze, water_grid, camera)
+            for step in range(60):
+                player_pos = [min(size - 2, 1 + step * 2)] * 2
+                camera.follow(player_pos)
+                renderer.draw(screen, player_pos)
+        yield ("camera_60_frames", {"size": size}, frames, None)
+
+def bench_save_load(sizes):
+    for size in sizes:
+        maze = bench_maze(size)
+        water_grid = initialize_water_grid(size, size)
+        water_grid.array[:, :size // 2] = maze.array[:, :size // 2] != 0
+        water_queue = FloodFrontier(size, size)
+        parameters = {'elapsed': 0.0, 'normal': 6.0, 'downward': 14.0, 'round_count': 1}
+        state = ([1, 1], maze, BENCH_SEED, 10.0, DEFAULT_DIFFICULTY, water_grid, water_queue, parameters)
+        yield ("save_load_binary", {"size": size},
+               lambda state=state: unpack_game_state(pack_game_state(*state)), None)
+        yield ("save_load_json", {"size": size},
+               lambda state=state: decode_game_state(json.loads(json.dumps(encode_game_state(*state)))), None)
+
+BENCHMARKS = {
+    "generate": bench_generate,
+    "pathfinding": bench_pathfinding,
+    "dead_ends": bench_dead_ends,
+    "flood": bench_flood,
+    "render": bench_render,
+    "viewport": bench_viewport,
+    "save_load": bench_save_load,
+}
+
+# Function to run the suite
+def run_benchmarks(sizes=BENCH_SIZES, only=None, repeat=5, log=None):
+    """Run the benchmarks (all, or those named in `only`) and return the results as a dict."""
+    results = []
+    for group, benchmark in BENCHMARKS.items():
+        if only and group not in only:
+            continue
+        for name, parameters, function, setup in benchmark(sizes):
+            # Large cases are slow, so they are repeated less
+            cases = repeat if parameters.get("size", 0) <= 101 else max(1, repeat // 2)
+            times = measure(function, cases, setup)
+            result = {"name": name, "params": parameters, "repeat": cases,
+                      "min": min(times), "median": statistics.median(times)}
+            results.append(result)
+            if log is not None:
+                log(result)
+    return {
+        "seed": BENCH_SEED,
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results
+    }
+
+# Function to describe a result on one line
+def format_result(result, baseline=None):
+    parameters = " ".join("%s=%s" % item for item in result["params"].items())
+    line = "%-28s %-36s min %10.4f ms  median %10.4f ms" % (
+        result["name"], parameters, result["min"] * 1000, result["median"] * 1000)
+    if baseline is not None:
+        line += "  %5.2fx vs baseline" % (baseline["min"] / result["min"] if result["min"] else float("inf"))
+    return line
+
+# Run the suite from the command line
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Floating Maze engine")
+    parser.add_argument("--quick", action="store_true", help="small boards only")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS), help="run only these groups")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case")
+    parser.add_argument("--out", default=None, help="write the results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="JSON results of an earlier run to compare with")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_DIR, help="maze cache directory of the benchmark mazes")
+    parser.add_argument("--no-cache", action="store_true", help="generate the benchmark mazes instead")
+    args = parser.parse_args(argv)
+
+    global bench_cache
+    bench_cache = None if args.no_cache else MazeCache(args.cache)
+
+    baselines = {}
+    if args.compare:
+        with open(args.compare) as file:
+            for result in json.load(file)["results"]:
+                baselines[(result["name"], json.dumps(result["params"], sort_keys=True))] = result
+
+    def log(result):
+        print(format_result(result, baselines.get((result["name"], json.dumps(result["params"], sort_keys=True)))))
+        sys.stdout.flush()
+
+    report = run_benchmarks(QUICK_SIZES if args.quick else BENCH_SIZES, args.only, args.repeat, log)
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=1)
+    if bench_cache is not None:
+        stats = bench_cache.stats()
+        print("maze cache: %d hits, %d misses" % (stats["hits"], stats["misses"]))
+
+if __name__ == "__main__":
+    main()
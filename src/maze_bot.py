@@ -0,0 +1,229 @@
+'''
+Floating Maze - autoplay bot and survival simulator
+Version 20241111
+Copyright: DOF Studio
+
+A headless player for Kana that plays rounds by the game's rules: it clicks
+cells within the move range (adjust_move_range and find_path_within_range,
+through ReachCache), walks the clicked path as the game does (RoundState.walk)
+and drags Kana onto the exit where no path leads to it (as on boards of even
+size). The flood spreads and speeds up from round to round exactly as in
+play_maze. The simulator plays whole sessions (rounds until Kana is flooded)
+over ranges of seeds, board sizes and difficulties in a process pool, without
+waiting for real time, and reports how many rounds were survived.
+
+Usage: python maze_bot.py --seeds 0:100 --sizes 57,56x42 --difficulties 0,32,100 [--out sessions.csv]
+'''
+
+import os
+import csv
+import time
+import argparse
+import itertools
+import numpy
+from multiprocessing import Pool
+from maze_engine import (
+    DEFAULT_MAZE_WIDTH, DEFAULT_MAZE_HEIGHT, DEFAULT_DIFFICULTY, TICK_RATE, TICK_SECONDS, ReachCache, find_path,
+    prepare_round
+)
+from maze_batch import parse_ints, parse_sizes
+
+# Ticks the bot waits after arriving before it clicks again (a player's reaction time)
+BOT_THINK_TICKS = 30
+
+# Limits of a session, so a bot that cannot reach the exit still finishes
+MAX_ROUNDS = 100
+MAX_ROUND_TICKS = 10 * 60 * TICK_RATE  # Ten minutes of game time
+
+# Seed step between the rounds of a session, as play_maze does with a seed
+ROUND_SEED_STEP = 11
+
+# Columns of the session results, in output order
+SESSION_COLUMNS = ("seed", "width", "height", "difficulty", "flood_mode", "rounds_survived", "end_reason", "ticks",
+                   "game_seconds", "clicks", "wall_seconds")
+
+# Why a session ended: Kana was flooded, or it was cut off by MAX_ROUND_TICKS or by the round limit
+END_REASONS = ("flooded", "timeout", "max_rounds")
+
+# Headless player of a round
+class AutoplayBot:
+    """
+    Plays a RoundState by clicking, like a player with the mouse.
+
+    It follows the shortest route from its position to the exit. Whenever it
+    stands still for `think_ticks` ticks, it clicks the cell of the route
+    furthest ahead within the current move range, and the round walks the path
+    of that click as it does for a player (RoundState.walk). When the exit is
+    only diagonally next to the maze's passages, the route ends with a drag onto
+    it.
+    """
+    def __init__(self, think_ticks=BOT_THINK_TICKS):
+        self.think_ticks = think_ticks
+        self.reach = ReachCache()
+
+    def start(self, state):
+        """Get ready to play a new round."""
+        self.route = []         # Cells from the player to the exit
+        self.route_index = {}   # Cell -> position in `route`
+        self.wait = self.think_ticks
+        self.clicks = 0
+
+    def plan(self, state):
+        maze, position, (end_x, end_y) = state.maze, tuple(state.player_pos), state.end_pos
+        self.route = find_path(maze, position, state.end_pos)
+        if not self.route:
+            # Walk to an open cell touching the exit, then drag onto it
+            for dx, dy in ((-1, -1), (-1, 0), (0, -1), (1, -1), (-1, 1), (1, 0), (0, 1), (1, 1)):
+                if maze.in_bounds(end_x + dx, end_y + dy) and maze.is_open(end_x + dx, end_y + dy):
+                    route = find_path(maze, position, (end_x + dx, end_y + dy))
+                    if route:
+                        self.route = route + [state.end_pos]
+                        break
+        self.route_index = {cell: i for i, cell in enumerate(self.route)}
+
+    def act(self, state):
+        """Click on `state` before a tick, once the last click was walked and the bot has waited."""
+        if state.walking():
+            return
+        if self.wait > 0:
+            self.wait -= 1
+            return
+        self.click(state)
+        self.wait = self.think_ticks
+
+    def click(self, state):
+        position = tuple(state.player_pos)
+        if position not in self.route_index:
+            self.plan(state)  # Off the route (or the first click of the round)
+        if not self.route:
+            return  # The exit cannot be reached, e.g. on boards of even size
+        reach = self.reach.update(state.maze, position)
+        start = self.route_index[position]
+        for i in range(min(len(self.route) - 1, start + reach.move_range), start, -1):
+            if reach.distance(*self.route[i]) is not None:
+                state.walk(reach.path_to(*self.route[i]))
+                self.clicks += 1
+                return
+        if start + 1 < len(self.route):
+            state.queue_move(*self.route[start + 1])  # The drag onto the exit
+            self.clicks += 1
+
+# Function to let the bot play one round
+def play_round(state, bot, max_ticks=MAX_ROUND_TICKS):
+    """Play `state` with `bot` until it is decided or `max_ticks` ticks passed; return the outcome."""
+    bot.start(state)
+    while state.outcome is None and state.tick_count < max_ticks:
+        bot.act(state)
+        state.tick(TICK_SECONDS)
+    return state.outcome
+
+# Function to play a session of rounds
+def play_session(seed, width, height, difficulty=DEFAULT_DIFFICULTY, flood_mode='queue',
+                 think_ticks=BOT_THINK_TICKS, max_rounds=MAX_ROUNDS):
+    """
+    Play rounds as play_maze does with `seed`, until the bot is flooded (or is
+    still in a round after MAX_ROUND_TICKS, or survived `max_rounds` rounds).
+    Round n is generated from seed + 11 n and floods at the speed
+    water_speed_schedule sets for round n. Return a dict of SESSION_COLUMNS;
+    `end_reason` tells the sessions that were cut off ('timeout' and
+    'max_rounds') from those where the bot was flooded, since their rounds
+    survived are only a lower bound.
+    """
+    start = time.perf_counter()
+    bot = AutoplayBot(think_ticks)
+    survived = ticks = clicks = 0
+    end_reason = "max_rounds"
+    for round_count in range(1, max_rounds + 1):
+        state = prepare_round(width, height, seed + ROUND_SEED_STEP * round_count, difficulty, round_count,
+                              flood_mode)
+        outcome = play_round(state, bot)
+        ticks += state.tick_count
+        clicks += bot.clicks
+        if outcome != 'won':
+            end_reason = "flooded" if outcome == 'flooded' else "timeout"
+            break
+        survived += 1
+    return {"seed": seed, "width": width, "height": height, "difficulty": difficulty, "flood_mode": flood_mode,
+            "rounds_survived": survived, "end_reason": end_reason, "ticks": ticks, "game_seconds": ticks * TICK_SECONDS, "clicks": clicks,
+            "wall_seconds": time.perf_counter() - start}
+
+# Function to play one session of a simulation
+def session_job(job):
+    return play_session(*job)
+
+# Function to summarize the rounds survived per board size and difficulty
+def survival_summary(sessions):
+    """
+    Return {(width, height, difficulty): summary}, a summary holding the number
+    of sessions, the mean, median, 90th percentile and maximum of the rounds
+    survived, `counts`, the number of sessions that survived each number of
+    rounds (index 0 for none), and `ends`, the number of sessions per
+    END_REASONS. Sessions cut off by a limit count with the rounds they reached,
+    so when `ends` holds any, the statistics are lower bounds.
+    """
+    groups = {}
+    for session in sessions:
+        key = (session["width"], session["height"], session["difficulty"])
+        groups.setdefault(key, []).append(session)
+    summary = {}
+    for key, group in groups.items():
+        rounds = numpy.array([session["rounds_survived"] for session in group])
+        ends = dict.fromkeys(END_REASONS, 0)
+        for session in group:
+            ends[session["end_reason"]] += 1
+        summary[key] = {"sessions": len(rounds), "mean": float(rounds.mean()),
+                        "median": float(numpy.median(rounds)), "p90": float(numpy.percentile(rounds, 90)),
+                        "max": int(rounds.max()), "counts": numpy.bincount(rounds).tolist(), "ends": ends}
+    return summary
+
+# Function to describe a summary on a few lines
+def format_summary(summary):
+    lines = []
+    for (width, height, difficulty), group in sorted(summary.items()):
+        lines.append("%dx%d difficulty %d: %d sessions, rounds survived mean %.2f, median %g, p90 %g, max %d" % (
+            width, height, difficulty, group["sessions"], group["mean"], group["median"], group["p90"],
+            group["max"]))
+        cut_off = group["ends"]["timeout"] + group["ends"]["max_rounds"]
+        if cut_off:
+            lines.append("    %d cut off (%d at the round limit, %d timed out in a round): lower bounds" % (
+                cut_off, group["ends"]["max_rounds"], group["ends"]["timeout"]))
+        lines.append("    " + "  ".join("%d:%d" % (rounds, count) for rounds, count in enumerate(group["counts"])
+                                        if count))
+    return "\n".join(lines)
+
+# Run a simulation from the command line
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate Floating Maze sessions with the autoplay bot")
+    parser.add_argument("--seeds", default="0:100", help="session seed range A:B or list A,B,C")
+    parser.add_argument("--sizes", default="%dx%d" % (DEFAULT_MAZE_WIDTH, DEFAULT_MAZE_HEIGHT), help="board sizes, e.g. 57,101,56x42")
+    parser.add_argument("--difficulties", default=str(DEFAULT_DIFFICULTY), help="difficulty list, e.g. 0,32,100")
+    parser.add_argument("--flood-mode", choices=("queue", "arrival"), default="queue", help="flood mode of the rounds")
+    parser.add_argument("--think-ticks", type=int, default=BOT_THINK_TICKS, help="ticks the bot waits between clicks")
+    parser.add_argument("--max-rounds", type=int, default=MAX_ROUNDS, help="stop a session after this many rounds")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--out", default=None, help="write one CSV row per session to this file")
+    args = parser.parse_args(argv)
+
+    jobs = [(seed, width, height, difficulty, args.flood_mode, args.think_ticks, args.max_rounds)
+            for (width, height), difficulty, seed in itertools.product(
+                parse_sizes(args.sizes), parse_ints(args.difficulties), parse_ints(args.seeds))]
+    start = time.perf_counter()
+    sessions = []
+    with Pool(args.workers) as pool:
+        for session in pool.imap(session_job, jobs, chunksize=4):
+            sessions.append(session)
+    elapsed = time.perf_counter() - start
+    if args.out:
+        with open(args.out, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(SESSION_COLUMNS)
+            for session in sessions:
+                writer.writerow([session[column] for column in SESSION_COLUMNS])
+
+    game_seconds = sum(session["game_seconds"] for session in sessions)
+    print(format_summary(survival_summary(sessions)))
+    print("%d sessions, %.0f s of game time in %.1f s (%.0fx real time)" % (
+        len(sessions), game_seconds, elapsed, game_seconds / elapsed if elapsed else 0.0))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+'''
+Floating Maze - generated maze cache
+Version 20241111
+Copyright: DOF Studio
+
+With a seed, generate_maze is a pure function of its arguments, so generated
+mazes and the data derived from them (solution path, precomputed flood) are
+kept on disk and reused. Entries are compressed .npz files in one directory;
+the least recently used ones are deleted when the directory grows past its
+size limit. Hits, misses and evictions are also added up in a stats file in the
+directory, shared by every process using it (the game's prefetch worker, the
+benchmarks), so `python maze_cache.py` can report them.
+
+Usage: python maze_cache.py [DIRECTORY] [--clear]
+'''
+
+import os
+import io
+import json
+import zipfile
+import argparse
+import numpy
+from maze_engine import (
+    DEFAULT_DIFFICULTY, MazeGrid, FloodField, RandomStream, RoundState, generate_maze, find_solution_path
+)
+
+# Bump when generate_maze or compute_flood_arrival change their output, so old entries are not used
+CACHE_VERSION = 3
+
+# Default location and size limit of the cache
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".amaze", "cache")
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+# File in the cache directory holding the counters of every process that used it
+STATS_FILE = "stats.json"
+STATS_COUNTERS = ("hits", "misses", "evictions")
+
+# Arrays of the entries of each kind, checked on read so an incomplete entry is a miss
+MAZE_KEYS = ("cells_low", "cells_high", "solution", "rng_state")
+FLOOD_KEYS = ("order", "arrival", "pops", "downward", "start", "initial", "rng_state")
+
+# On-disk cache of generated mazes
+class MazeCache:
+    """
+    Cache of generated mazes, their solution paths and precomputed floods.
+
+    Args:
+        directory: where the entries are stored (created if missing).
+        max_bytes: the total size of the entries is kept below this by
+            deleting the least recently used ones.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(size for _, _, size in self.entries())
+
+    def entries(self):
+        """List (last use time, path, size) of the entries, least recently used first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                path = os.path.join(self.directory, name)
+                try:
+                    info = os.stat(path)
+                except FileNotFoundError:
+                    continue  # Evicted by another process meanwhile
+                entries.append((info.st_mtime, path, info.st_size))
+        entries.sort()
+        return entries
+
+    def stats(self, saved=False):
+        """
+        The hits, misses, evictions and hit rate of this cache object, or with
+        `saved` those of every process since the directory's stats were reset,
+        along with the entries and bytes in the directory.
+        """
+        counters = self.saved_counters() if saved else {name: getattr(self, name) for name in STATS_COUNTERS}
+        lookups = counters["hits"] + counters["misses"]
+        return dict(counters, hit_rate=counters["hits"] / lookups if lookups else 0.0,
+                    entries=len(self.entries()), bytes=self.total_bytes)
+
+    def saved_counters(self):
+        """The counters in the directory's stats file (all 0 if there is none yet)."""
+        counters = dict.fromkeys(STATS_COUNTERS, 0)
+        try:
+            with open(os.path.join(self.directory, STATS_FILE)) as file:
+                saved = json.load(file)
+            counters.update((name, int(saved[name])) for name in STATS_COUNTERS if name in saved)
+        except (OSError, ValueError, TypeError):
+            pass  # Missing or damaged stats start again from 0
+        return counters
+
+    def save_counters(self, counters):
+        path = os.path.join(self.directory, STATS_FILE)
+        temporary = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            with open(temporary, "w") as file:
+                json.dump(counters, file)
+            os.replace(temporary, path)
+        except OSError:
+            pass  # The stats are informative; a lookup never fails over them
+
+    def count(self, name, amount=1):
+        """Add to a counter of this object and of the directory's stats file."""
+        setattr(self, name, getattr(self, name) + amount)
+        counters = self.saved_counters()
+        counters[name] += amount
+        self.save_counters(counters)
+
+    def path(self, kind, width, height, seed, difficulty, *extra):
+        name = "%s-v%d-%dx%d-s%d-d%d" % (kind, CACHE_VERSION, width, height, seed, difficulty)
+        return os.path.join(self.directory, "-".join([name] + [str(part) for part in extra]) + ".npz")
+
+    def read(self, path, keys):
+        """
+        Return the arrays of an entry and mark it as used, or None on a miss
+        (also when the entry lacks one of the arrays named in `keys`).
+        """
+        try:
+            with open(path, "rb") as file:
+                arrays = dict(numpy.load(io.BytesIO(file.read()), allow_pickle=False))
+            if not all(key in arrays for key in keys):
+                raise ValueError("incomplete cache entry")
+            os.utime(path)  # The modification time is the last use, for the LRU order
+        except (OSError, ValueError, zipfile.BadZipFile):
+            self.count("misses")
+            return None
+        self.count("hits")
+        return arrays
+
+    def write(self, path, **arrays):
+        """Store an entry, then evict the least recently used ones above the size limit."""
+        buffer = io.BytesIO()
+        numpy.savez_compressed(buffer, **arrays)
+        data = buffer.getvalue()
+        temporary = "%s.%d.tmp" % (path, os.getpid())
+        with open(temporary, "wb") as file:
+            file.write(data)
+        if os.path.exists(path):
+            self.total_bytes -= os.path.getsize(path)
+        os.replace(temporary, path)  # Readers never see a half-written entry
+        self.total_bytes += len(data)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        entries = self.entries()
+        self.total_bytes = sum(size for _, _, size in entries)
+        evicted = 0
+        for _, path, size in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+            evicted += 1
+        if evicted:
+            self.count("evictions", evicted)
+
+    def clear(self):
+        """Delete every entry and reset the saved stats."""
+        for _, path, _ in self.entries():
+            os.remove(path)
+        self.total_bytes = 0
+        self.save_counters(dict.fromkeys(STATS_COUNTERS, 0))
+
+    def maze(self, width, height, seed, difficulty=DEFAULT_DIFFICULTY):
+        """
+        Return (maze, solution path, rng state) for generate_maze's arguments.
+        The solution path is the set of (x, y) cells from (1, 1) to the exit, as
+        returned by find_solution_path on the finished maze, and the rng state
+        that of the seed's RandomStream after generating it.
+        """
+        path = self.path("maze", width, height, seed, difficulty)
+        arrays = self.read(path, MAZE_KEYS)
+        if arrays is not None:
+            size = width * height
+            cells = (numpy.unpackbits(arrays["cells_low"], count=size) |
+                     numpy.unpackbits(arrays["cells_high"], count=size) << 1)
+            maze = MazeGrid(width, height, data=cells.tobytes())
+            solution = set(zip((arrays["solution"] % width).tolist(), (arrays["solution"] // width).tolist()))
+            return maze, solution, json.loads(arrays["rng_state"].tobytes())
+
+        rng = RandomStream(seed)
+        maze = generate_maze(width, height, difficulty=difficulty, rng=rng)
+        solution = find_solution_path(maze, (1, 1), (width - 2, height - 2))
+        cells = maze.array.reshape(-1)
+        self.write(path,
+                   cells_low=numpy.packbits(cells & 1),
+                   cells_high=numpy.packbits(cells >> 1 & 1),
+                   solution=numpy.array(sorted(y * width + x for x, y in solution), dtype=numpy.uint32),
+                   rng_state=numpy.frombuffer(json.dumps(rng.get_state()).encode(), dtype=numpy.uint8))
+        return maze, solution, rng.get_state()
+
+    def prepare_round(self, width, height, seed, difficulty=DEFAULT_DIFFICULTY, round_count=1, flood_mode='queue'):
+        """Like maze_engine.prepare_round, taking the maze and precomputed flood from the cache."""
+        maze, _, rng_state = self.maze(width, height, seed, difficulty)
+        state = RoundState(maze, round_count, RandomStream.from_state(rng_state), flood_mode)
+        if flood_mode != 'arrival':
+            return state
+
+        path = self.path("flood", width, height, seed, difficulty, "r%d" % round_count)
+        arrays = self.read(path, FLOOD_KEYS)
+        if arrays is not None:
+            flood_field = FloodField(width, height, arrays["order"], arrays["arrival"], arrays["pops"],
+                                     arrays["downward"], float(arrays["start"]), arrays["initial"])
+            state.prepared_flood = (flood_field, json.loads(arrays["rng_state"].tobytes()))
+            return state
+
+        state.prepare_flood()
+        flood_field, rng_state = state.prepared_flood
+        self.write(path, order=flood_field.order, arrival=flood_field.arrival, pops=flood_field.pops,
+                   downward=flood_field.downward, start=numpy.float64(flood_field.start),
+                   initial=flood_field.initial,
+                   rng_state=numpy.frombuffer(json.dumps(rng_state).encode(), dtype=numpy.uint8))
+        return state
+
+# Caches opened in this process, by directory
+_open_caches = {}
+
+# Function to get the cache of a directory, shared within the process
+def open_cache(directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_BYTES):
+    cache = _open_caches.get(directory)
+    if cache is None:
+        cache = _open_caches[directory] = MazeCache(directory, max_bytes)
+    return cache
+
+# Show what is in a cache directory
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the Floating Maze cache")
+    parser.add_argument("directory", nargs="?", default=DEFAULT_CACHE_DIR, help="cache directory")
+    parser.add_argument("--clear", action="store_true", help="delete every entry")
+    args = parser.parse_args(argv)
+
+    cache = MazeCache(args.directory)
+    if args.clear:
+        cache.clear()
+    stats = cache.stats(saved=True)
+    print("%s: %d entries, %.1f KB (limit %.1f MB)" % (args.directory, stats["entries"], stats["bytes"] / 1024,
+                                                        cache.max_bytes / 1024 / 1024))
+    print("%d hits, %d misses (hit rate %.1f%%), %d evictions" % (stats["hits"], stats["misses"],
+                                                                   stats["hit_rate"] * 100, stats["evictions"]))
+
+if __name__ == "__main__":
+    main()
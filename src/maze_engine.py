@@ -0,0 +1,1562 @@
+'''
+Floating Maze - game engine
+Version 20241111
+Copyright: DOF Studio
+
+Maze generation, pathfinding, water flood and save-state conversion. This module
+only depends on NumPy and has no side effects on import, so it can be used from
+scripts, tests and servers without pygame or a display.
+'''
+
+import numpy
+from collections import deque
+import itertools
+import math
+import heapq
+import json
+import struct
+import zlib
+import copy
+
+# Constants and global settings
+DEFAULT_MAZE_WIDTH = 56   # Width and height should be odd numbers
+DEFAULT_MAZE_HEIGHT = 42
+DEFAULT_MOVE_RANGE = 20   # Number of steps for forward movement limit
+DEFAULT_DIFFICULTY = 32  # Default difficulty level
+FPS = 60
+
+# Fixed simulation step: ticks per second, and the most ticks run for one frame
+TICK_RATE = 60
+TICK_SECONDS = 1 / TICK_RATE
+MAX_FRAME_TICKS = 15  # A quarter of a second; longer stalls are dropped, not caught up
+MOVE_STEP_SECONDS = TICK_SECONDS  # Time the player takes to walk one cell of a clicked path
+
+# Constants for water spread
+WATER_SPREAD_DELAY = 5           # Delay for 5 seconds
+WATER_SPREAD_RATE_NORMAL = 6     # Spread rate for non-downward paths (cells per second)
+WATER_SPREAD_RATE_DOWNWARD = 14  # Spread rate for downward paths (cells per second)
+
+# Cell codes of the maze grid (walls are 0, so any non-zero cell can be walked on)
+CELL_WALL = 0
+CELL_PATH = 1
+CELL_EXIT = 2
+
+# Legacy one-character form of the cell codes, as used in JSON saves
+CELL_CHARS = '# E'
+_CHARS_TO_CELLS = bytes.maketrans(CELL_CHARS.encode(), bytes(range(len(CELL_CHARS))))
+_CELLS_TO_CHARS = bytes.maketrans(bytes(range(len(CELL_CHARS))), CELL_CHARS.encode())
+
+# Compact grid storage
+class Grid:
+    """
+    A width x height grid storing one byte per cell.
+
+    The bytes live in a bytearray, which is cheap to index from Python loops with
+    the flat index `y * width + x`. `array` is a (height, width) NumPy view over the
+    same memory for vectorized work, so both always see the same cells.
+    """
+    dtype = numpy.uint8
+
+    def __init__(self, width, height, fill=0, data=None):
+        self.width = width
+        self.height = height
+        if data is None:
+            self.data = bytearray([fill]) * (width * height)
+        else:
+            self.data = bytearray(data)
+        self.array = numpy.frombuffer(self.data, dtype=self.dtype).reshape(height, width)
+
+    def index(self, x, y):
+        return y * self.width + x
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get(self, x, y):
+        return self.data[y * self.width + x]
+
+    def set(self, x, y, value):
+        self.data[y * self.width + x] = value
+
+    def copy(self):
+        return type(self)(self.width, self.height, data=self.data)
+
+    def nbytes(self):
+        return len(self.data)
+
+    # Pickle only the bytes; the NumPy view is rebuilt on load
+    def __getstate__(self):
+        return (self.width, self.height, bytes(self.data))
+
+    def __setstate__(self, state):
+        width, height, data = state
+        self.__init__(width, height, data=data)
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and self.width == other.width and
+                self.height == other.height and self.data == other.data)
+
+# Maze grid with one cell code per cell
+class MazeGrid(Grid):
+    _path_finder = None
+    _water_neighbours = None
+
+    def __init__(self, width, height, fill=CELL_WALL, data=None):
+        super().__init__(width, height, fill, data)
+
+    def is_open(self, x, y):
+        """Whether (x, y) is inside the maze and not a wall."""
+        return 0 <= x < self.width and 0 <= y < self.height and self.data[y * self.width + x] != CELL_WALL
+
+    def path_finder(self):
+        """Return the PathFinder of this maze, created on first use."""
+        if self._path_finder is None:
+            self._path_finder = PathFinder(self)
+        return self._path_finder
+
+    def water_neighbours(self):
+        """Return the WaterNeighbours of this maze, created on first use."""
+        if self._water_neighbours is None:
+            self._water_neighbours = WaterNeighbours(self)
+        return self._water_neighbours
+
+    def to_list(self):
+        """Convert to the legacy list of lists of '#', ' ' and 'E' characters."""
+        text = bytes(self.data).translate(_CELLS_TO_CHARS).decode()
+        return [list(text[y * self.width:(y + 1) * self.width]) for y in range(self.height)]
+
+    @classmethod
+    def from_list(cls, maze):
+        """Build a maze grid from the legacy list of lists of characters."""
+        text = ''.join(''.join(row) for row in maze).encode()
+        return cls(len(maze[0]), len(maze), data=text.translate(_CHARS_TO_CELLS))
+
+# Water grid with one boolean per cell
+class WaterGrid(Grid):
+    dtype = numpy.bool_
+
+    def __init__(self, width, height, fill=False, data=None):
+        super().__init__(width, height, int(fill), data)
+
+    def to_list(self):
+        """Convert to the legacy list of lists of booleans."""
+        return self.array.tolist()
+
+    @classmethod
+    def from_list(cls, water_grid):
+        """Build a water grid from the legacy list of lists of booleans."""
+        array = numpy.asarray(water_grid, dtype=numpy.bool_)
+        return cls(array.shape[1], array.shape[0], data=array.tobytes())
+
+# Pathfinding directions as (dx, dy)
+PATH_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))   # Left, Right, Up, Down
+RANGE_DIRECTIONS = ((0, 1), (1, 0), (0, -1), (-1, 0))  # Down, Right, Up, Left
+
+# Mazes with more cells than this are searched with dictionaries instead of per-cell lists
+SPARSE_SEARCH_CELLS = 1 << 22
+
+# Visit marks of a sparse PathFinder: cells not visited yet read as 0
+class SparseMarks(dict):
+    def __missing__(self, index):
+        return 0
+
+# Shared pathfinding core
+class PathFinder:
+    """
+    Breadth-first, A* and bidirectional search over the flat cell indices
+    `y * width + x` of a maze.
+
+    Searches only record a parent index per visited cell and rebuild the path
+    once at the end. Parents, visit marks and the queue are lists allocated once
+    per maze and reused: each search takes a new stamp, so a cell counts as
+    visited only if its mark equals the current stamp and nothing is cleared.
+    The maze cells are read live, so carving after creation is fine.
+
+    On mazes larger than SPARSE_SEARCH_CELLS the per-cell lists would take
+    more memory than the maze itself, so they are dictionaries holding only the
+    cells of the last search, which keeps bounded searches small on any board.
+    """
+    def __init__(self, maze):
+        self.maze = maze
+        self.width = maze.width
+        self.size = maze.width * maze.height
+        self.sparse = self.size > SPARSE_SEARCH_CELLS
+        self.parent = self.marks()
+        self.seen = self.marks()
+        self.queue = self.marks()
+        self.stamp = 0
+        self.cost = None         # Allocated on the first A* search
+        self.parent_back = None  # Allocated on the first bidirectional search
+        self.seen_back = None
+
+    def marks(self):
+        return SparseMarks() if self.sparse else [0] * self.size
+
+    def new_stamp(self):
+        """Start a search: take a new visit stamp (a sparse finder also forgets the last search)."""
+        if self.sparse:
+            for marks in (self.parent, self.seen, self.queue, self.cost, self.parent_back, self.seen_back):
+                if marks is not None:
+                    marks.clear()
+        self.stamp += 1
+        return self.stamp
+
+    def visited(self, count, first=0):
+        """The flat indices of queued cells `first` to `count` of the last search."""
+        if self.sparse:
+            return [self.queue[n] for n in range(first, count)]
+        return self.queue[first:count]
+
+    def position(self, index):
+        """Convert a flat index to an (x, y) tuple."""
+        return (index % self.width, index // self.width)
+
+    def moves(self, directions):
+        """Return (dx, flat offset) pairs for the directions, as used by the searches."""
+        return [(dx, dx + dy * self.width) for dx, dy in directions]
+
+    def path(self, end, parent=None):
+        """Rebuild the path ending at `end` from parent pointers, start first."""
+        parent = self.parent if parent is None else parent
+        path = []
+        while end >= 0:
+            path.append(end)
+            end = parent[end]
+        path.reverse()
+        return path
+
+    def bfs(self, start, end, max_steps=None, directions=PATH_DIRECTIONS):
+        """
+        Return the shortest path from `start` to `end` as flat indices, or [].
+
+        Args:
+            max_steps: only paths of at most this many steps are searched.
+            directions: the order neighbours are visited in, which picks
+                between equally short paths.
+        """
+        width, size, cells = self.width, self.size, self.maze.data
+        parent, seen, queue = self.parent, self.seen, self.queue
+        moves = self.moves(directions)
+        stamp = self.new_stamp()
+
+        seen[start] = stamp
+        parent[start] = -1
+        if start == end:
+            return [start]
+        queue[0] = start
+        head, tail = 0, 1
+        level_end, steps = 1, 0  # The queue holds one BFS level after another
+
+        while head < tail:
+            if head == level_end:
+                steps += 1
+                level_end = tail
+            if max_steps is not None and steps >= max_steps:
+                break  # Only continue if the step limit is not exceeded
+            i = queue[head]
+            head += 1
+            x = i % width
+            for dx, step in moves:
+                j = i + step
+                if (0 <= j < size and 0 <= x + dx < width and
+                    cells[j] != CELL_WALL and seen[j] != stamp):
+                    seen[j] = stamp
+                    parent[j] = i
+                    if j == end:
+                        return self.path(end)
+                    queue[tail] = j
+                    tail += 1
+        return []
+
+    def reachable(self, start, max_steps=None, directions=PATH_DIRECTIONS):
+        """
+        Visit every cell within `max_steps` of `start`. Return the number of
+        cells visited; they are the first entries of `queue` and their parents
+        stay valid until the next search.
+        """
+        width, size, cells = self.width, self.size, self.maze.data
+        parent, seen, queue = self.parent, self.seen, self.queue
+        moves = self.moves(directions)
+        stamp = self.new_stamp()
+
+        seen[start] = stamp
+        parent[start] = -1
+        queue[0] = start
+        head, tail = 0, 1
+        level_end, steps = 1, 0
+
+        while head < tail:
+            if head == level_end:
+                steps += 1
+                level_end = tail
+            if max_steps is not None and steps >= max_steps:
+                break
+            i = queue[head]
+            head += 1
+            x = i % width
+            for dx, step in moves:
+                j = i + step
+                if (0 <= j < size and 0 <= x + dx < width and
+                    cells[j] != CELL_WALL and seen[j] != stamp):
+                    seen[j] = stamp
+                    parent[j] = i
+                    queue[tail] = j
+                    tail += 1
+        return tail
+
+    def astar(self, start, end, directions=PATH_DIRECTIONS):
+        """
+        Return a shortest path from `start` to `end` as flat indices, or [],
+        searching towards `end` first with the Manhattan distance heuristic.
+        """
+        width, size, cells = self.width, self.size, self.maze.data
+        parent, seen = self.parent, self.seen
+        if self.cost is None:
+            self.cost = self.marks()
+        cost = self.cost
+        moves = self.moves(directions)
+        stamp = self.new_stamp()
+        end_x, end_y = end % width, end // width
+
+        seen[start] = stamp
+        parent[start] = -1
+        cost[start] = 0
+        heap = [(abs(start % width - end_x) + abs(start // width - end_y), 0, start)]
+        while heap:
+            _, steps, i = heapq.heappop(heap)  # Among equal estimates, the deepest cell comes first
+            steps = -steps
+            if i == end:
+                return self.path(end)
+            if steps > cost[i]:
+                continue  # A shorter way to this cell was found after it was queued
+            steps += 1
+            x = i % width
+            for dx, step in moves:
+                j = i + step
+                if (0 <= j < size and 0 <= x + dx < width and cells[j] != CELL_WALL and
+                    (seen[j] != stamp or steps < cost[j])):
+                    seen[j] = stamp
+                    parent[j] = i
+                    cost[j] = steps
+                    estimate = steps + abs(x + dx - end_x) + abs(j // width - end_y)
+                    heapq.heappush(heap, (estimate, -steps, j))
+        return []
+
+    def bidirectional(self, start, end, directions=PATH_DIRECTIONS):
+        """
+        Return a shortest path from `start` to `end` as flat indices, or [],
+        growing breadth-first searches from both ends one level at a time.
+        """
+        width, size, cells = self.width, self.size, self.maze.data
+        if self.parent_back is None:
+            self.parent_back = self.marks()
+            self.seen_back = self.marks()
+        moves = self.moves(directions)
+        stamp = self.new_stamp()
+
+        if start == end:
+            return [start]
+        sides = [(self.parent, self.seen, self.seen_back), (self.parent_back, self.seen_back, self.seen)]
+        for index, (parent, seen, _) in zip((start, end), sides):
+            seen[index] = stamp
+            parent[index] = -1
+        frontiers = [[start], [end]]
+
+        while frontiers[0] and frontiers[1]:
+            # Grow the smaller frontier by one level
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            parent, seen, other_seen = sides[side]
+            meet = -1
+            level = []
+            for i in frontiers[side]:
+                x = i % width
+                for dx, step in moves:
+                    j = i + step
+                    if (0 <= j < size and 0 <= x + dx < width and
+                        cells[j] != CELL_WALL and seen[j] != stamp):
+                        seen[j] = stamp
+                        parent[j] = i
+                        if other_seen[j] == stamp and meet < 0:
+                            meet = j
+                        level.append(j)
+            if meet >= 0:
+                forward = self.path(meet, self.parent)
+                backward = self.path(meet, self.parent_back)
+                return forward + backward[-2::-1]
+            frontiers[side] = level
+        return []
+
+# Function to find a path between two cells with the shared pathfinding core
+def find_path(maze, start, end, method='bfs'):
+    """
+    Find a shortest path from `start` to `end` and return it as a list of
+    (x, y) tuples, or [] if there is none.
+
+    Args:
+        method: 'bfs', or 'astar' / 'bidirectional', which visit fewer cells on
+            long point-to-point queries.
+    """
+    finder = maze.path_finder()
+    search = {'bfs': finder.bfs, 'astar': finder.astar, 'bidirectional': finder.bidirectional}[method]
+    return [finder.position(i) for i in search(maze.index(*start), maze.index(*end))]
+
+# AI Assitant to find path
+def find_path_within_range(maze, start, end, max_steps):
+    finder = maze.path_finder()
+    path = finder.bfs(maze.index(*start), maze.index(*end), max_steps, RANGE_DIRECTIONS)
+    return [finder.position(i) for i in path]  # Return the path if valid, otherwise an empty list
+
+# Smallest block of values RandomStream draws at once
+RANDOM_BLOCK = 4096
+
+# Seeded source of the random numbers of a round
+class RandomStream:
+    """
+    Uniform random numbers in [0, 1) for the maze generator and the flood of a
+    round, from a seeded numpy.random.Generator.
+
+    Values are drawn ahead in blocks of at least RANDOM_BLOCK and handed out in
+    order, so the small draws of the flood (a few events per frame) cost a slice
+    rather than a NumPy call each; the next block is drawn when one runs short.
+    The state is the generator state before the current block and the position
+    in it, which is enough to draw that block again: `get_state` and `set_state`
+    save and restore the stream exactly, as JSON-serializable dicts.
+    """
+    def __init__(self, seed=None, block_size=RANDOM_BLOCK):
+        self.generator = numpy.random.default_rng(seed)
+        self.block_size = block_size
+        self.block_state = self.generator.bit_generator.state
+        self.block = numpy.zeros(0)
+        self.position = 0
+
+    def refill(self, count):
+        """Draw a new block of at least `count` values (what is left of the last one is skipped)."""
+        self.block_state = self.generator.bit_generator.state
+        self.block = self.generator.random(max(self.block_size, count))
+        self.position = 0
+
+    def random(self, size=None):
+        """Return a float, or an array of `size` (a count or a shape) values, like Generator.random."""
+        if size is None:
+            if self.position >= len(self.block):
+                self.refill(1)
+            self.position += 1
+            return float(self.block[self.position - 1])
+        count = size if isinstance(size, int) else math.prod(size)
+        if self.position + count > len(self.block):
+            self.refill(count)
+        values = self.block[self.position:self.position + count]
+        self.position += count
+        return values.reshape(size)
+
+    def integers(self, high, size):
+        """Return an array of `size` ints from 0 to `high` - 1."""
+        return (self.random(size) * high).astype(numpy.intp)
+
+    def get_state(self):
+        return {"generator": self.block_state, "drawn": len(self.block), "position": self.position}
+
+    def set_state(self, state):
+        self.generator.bit_generator.state = state["generator"]
+        self.block_state = state["generator"]
+        self.block = self.generator.random(state["drawn"])
+        self.position = state["position"]
+
+    @classmethod
+    def from_state(cls, state):
+        stream = cls()
+        stream.set_state(state)
+        return stream
+
+# Water spread directions: Left, Right, Up, Down
+WATER_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+# Every order of the water spread directions, as (24, 4) arrays of dx and dy
+WATER_ORDERS = numpy.array(list(itertools.permutations(WATER_DIRECTIONS)))
+WATER_ORDERS_DX = WATER_ORDERS[:, :, 0]
+WATER_ORDERS_DY = WATER_ORDERS[:, :, 1]
+WATER_ORDERS_DOWNWARD = WATER_ORDERS_DY == 1
+
+# Neighbour lookup for water spread
+class WaterNeighbours:
+    """
+    Finds the cells a batch of water spread events floods next.
+
+    When the maze is closed by walls no open cell has a neighbour outside it,
+    so the bounds checks are skipped and neighbours are plain flat index offsets.
+    """
+    def __init__(self, maze):
+        self.width = maze.width
+        self.height = maze.height
+        self.cells = maze.array.reshape(-1)
+        self.offsets = WATER_ORDERS_DX + WATER_ORDERS_DY * maze.width
+        self.sealed = not (maze.array[[0, -1], :].any() or maze.array[:, [0, -1]].any())
+
+    def spread(self, sources, order_draws, wet):
+        """
+        Return (targets, downward, parents) for the events at flat indices `sources`.
+
+        `order_draws` holds one uniform draw per event choosing its shuffled direction
+        order. Targets are open cells that are not `wet`, in the order a one-by-one
+        queue would have claimed them; `parents` gives the event each came from.
+        """
+        order = (order_draws * len(WATER_ORDERS)).astype(numpy.intp)
+        targets = sources[:, None] + self.offsets[order]
+        downward = WATER_ORDERS_DOWNWARD[order]
+        parents = numpy.repeat(numpy.arange(len(sources)), 4).reshape(-1, 4)
+
+        # Check bounds, then whether each cell is a path and not already occupied by water
+        if self.sealed:
+            targets, downward, parents = targets.ravel(), downward.ravel(), parents.ravel()
+        else:
+            nx = (sources % self.width)[:, None] + WATER_ORDERS_DX[order]
+            ny = (sources // self.width)[:, None] + WATER_ORDERS_DY[order]
+            inside = (nx >= 0) & (nx < self.width) & (ny >= 0) & (ny < self.height)
+            targets, downward, parents = targets[inside], downward[inside], parents[inside]
+        free = (self.cells[targets] != CELL_WALL) & ~wet[targets]
+        targets, downward, parents = targets[free], downward[free], parents[free]
+
+        # A cell reached by several events goes to the first one, as if popped in order
+        if len(targets) > 1 and len(numpy.unique(targets)) < len(targets):
+            first = numpy.sort(numpy.unique(targets, return_index=True)[1])
+            targets, downward, parents = targets[first], downward[first], parents[first]
+        return targets, downward, parents
+
+# Queue of water spread events
+class FloodFrontier:
+    """
+    FIFO queue of water spread events, kept as flat cell indices and a downward
+    flag in NumPy arrays so that update_water can take whole batches at once.
+
+    A cell is marked wet when it is enqueued and wet cells are never enqueued
+    again, so the queue holds at most width * height events over a round.
+    """
+    def __init__(self, width, height, capacity=1024):
+        self.width = width
+        self.height = height
+        self.cells = numpy.empty(capacity, dtype=numpy.int64)
+        self.downward = numpy.empty(capacity, dtype=numpy.bool_)
+        self.head = 0
+        self.tail = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def __iter__(self):
+        """Yield the queued events as legacy (x, y, direction) tuples."""
+        for i, down in zip(self.cells[self.head:self.tail].tolist(), self.downward[self.head:self.tail].tolist()):
+            yield (i % self.width, i // self.width, 'downward' if down else 'normal')
+
+    def append(self, event):
+        x, y, direction = event
+        self.extend(numpy.array([y * self.width + x]), numpy.array([direction == 'downward']))
+
+    def extend(self, cells, downward):
+        """Enqueue arrays of flat cell indices and their downward flags."""
+        count = len(cells)
+        if self.tail + count > len(self.cells):
+            # Drop the consumed head and grow the storage if still short of room
+            pending = len(self)
+            capacity = max(len(self.cells), 2 * (pending + count))
+            new_cells = numpy.empty(capacity, dtype=self.cells.dtype)
+            new_downward = numpy.empty(capacity, dtype=numpy.bool_)
+            new_cells[:pending] = self.cells[self.head:self.tail]
+            new_downward[:pending] = self.downward[self.head:self.tail]
+            self.cells, self.downward = new_cells, new_downward
+            self.head, self.tail = 0, pending
+        self.cells[self.tail:self.tail + count] = cells
+        self.downward[self.tail:self.tail + count] = downward
+        self.tail += count
+
+    def peek(self, count):
+        """Return (cells, downward) views of up to `count` events at the head."""
+        end = min(self.head + count, self.tail)
+        return self.cells[self.head:end], self.downward[self.head:end]
+
+    def pop(self, count):
+        self.head += count
+
+    def copy(self):
+        """A frontier holding the pending events only."""
+        frontier = FloodFrontier(self.width, self.height, max(len(self), 1))
+        frontier.extend(*self.peek(len(self)))
+        return frontier
+
+    @classmethod
+    def from_list(cls, events, width, height):
+        """Build a frontier from a list of legacy (x, y, direction) events."""
+        frontier = cls(width, height, max(len(events), 1))
+        if events:
+            xs, ys, directions = zip(*events)
+            frontier.extend(numpy.array(ys) * width + numpy.array(xs),
+                            numpy.array([direction == 'downward' for direction in directions]))
+        return frontier
+
+# Function to initialize water grid
+def initialize_water_grid(width, height):
+    """Initialize a grid to track water-occupied cells."""
+    return WaterGrid(width, height)
+
+# Function to initialize water in the starting position
+def initialize_water(water_grid, water_queue, start_pos):
+    """Initialize water at the starting position."""
+    x, y = start_pos
+    water_grid.set(x, y, True)
+    water_queue.append((x, y, 'normal'))  # Start spreading normally
+
+# Update water in the grid
+def update_water(maze, water_grid, water_queue, delta_time, water_parameters, rng=None):
+    """
+    Update water spread based on elapsed time.
+
+    Events leave the head of the queue one after another, each paying its spread
+    time (1 / rate plus a random jitter, plus an occasional bonus that holds the
+    water back) out of the elapsed time. Instead of popping them one by one, the
+    events the elapsed time can possibly pay for are taken as a batch: their
+    costs are drawn as arrays, a cumulative sum decides how many are paid for,
+    and all of them spread to their neighbours (in a random direction order per
+    event) in array operations.
+    The work per frame therefore depends on how much water spreads in that frame,
+    not on how long the frontier is.
+
+    Args:
+        maze: The maze grid.
+        water_grid: Grid tracking water-occupied cells.
+        water_queue: FloodFrontier managing water spread events.
+        delta_time: Time elapsed since last update.
+        water_parameters: Dictionary containing spread rates and other configurations.
+        rng: Source of random numbers with a `random(size)` method (default numpy.random).
+    """
+    if rng is None:
+        rng = numpy.random
+
+    # Accumulate elapsed time
+    water_parameters['elapsed'] += delta_time
+    
+    # Get parameters
+    rate_normal = water_parameters['normal']
+    rate_downrard = water_parameters['downward']
+    water = water_grid.array.reshape(-1)
+    neighbours = maze.water_neighbours()
+
+    # Process water spread based on elapsed time and spread rates
+    while len(water_queue):
+        elapsed = water_parameters['elapsed']
+
+        # An event costs at least 1 / rate, which bounds how many events the
+        # elapsed time can pay for
+        batch = int(elapsed * max(rate_normal, rate_downrard)) + 1
+        events, downward = water_queue.peek(batch)
+        batch = len(events)
+
+        # Determine spread rate based on direction
+        spread_rate = numpy.where(downward, rate_downrard, rate_normal)
+
+        # Introduce some random term, and a bonus which adds time to the cost
+        # (the last row of draws picks the shuffled direction order of each event)
+        draws = rng.random((5, batch))
+        cost = (1 + draws[0]) / spread_rate
+        bonus = numpy.where(draws[1] * 0.25 > draws[2], draws[3] * 0.25 / spread_rate, 0.0)
+
+        # Check how many events in a row have enough time to spread to next cell
+        # (the bonus is taken from the elapsed time before the event's check, as if
+        # added to its cost; the remaining time only drops along the batch)
+        remaining = elapsed - numpy.cumsum(cost + bonus)
+        spread = int(numpy.count_nonzero(remaining >= 0))
+        if spread < batch:
+            # The first event left waiting still takes its bonus
+            left = float(remaining[spread - 1]) if spread else elapsed
+            water_parameters['elapsed'] = max(left - bonus[spread], 0)
+        else:
+            water_parameters['elapsed'] = float(remaining[-1])
+        if spread == 0:
+            break  # Not enough time has passed to spread further
+
+        # Remove the spread events and let each spread in its shuffled direction order
+        targets, targets_downward, _ = neighbours.spread(events[:spread], draws[4, :spread], water)
+        water_queue.pop(spread)
+
+        # Occupy the cells with water and enqueue the new water spread events
+        water[targets] = True
+        water_queue.extend(targets, targets_downward)
+
+        if spread < batch:
+            break  # Not enough time has passed to spread further
+
+# Precomputed flood of a round
+class FloodField:
+    """
+    Arrival time of water at every cell, computed once for a round.
+
+    `order` lists the cells water spreads from in the order it reaches them,
+    `arrival` their (non-decreasing) arrival times, and `pops`/`downward` the
+    time each cell's own spread event leaves the queue and its direction. Times
+    are in seconds from when the field was computed, `start` being the time the
+    head event had already waited. `initial` marks cells that were flooded
+    before; cells never reached have an infinite arrival time in `arrival_grid`.
+    """
+    def __init__(self, width, height, order, arrival, pops, downward, start=0.0, initial=None):
+        self.width = width
+        self.height = height
+        self.order = order
+        self.arrival = arrival
+        self.pops = pops
+        self.downward = downward
+        self.start = start
+        self.initial = numpy.zeros(width * height, dtype=numpy.bool_) if initial is None else initial
+        self.arrival_grid = numpy.full(width * height, numpy.inf)
+        self.arrival_grid[self.initial] = 0.0
+        self.arrival_grid[order] = arrival
+        self.filled = 0  # Number of cells of `order` already copied into a water grid
+
+    def arrival_at(self, x, y):
+        return self.arrival_grid[y * self.width + x]
+
+    def is_wet(self, x, y, t):
+        return self.arrival_grid[y * self.width + x] <= t
+
+    def fill(self, water_grid, t):
+        """Mark the cells flooded by time `t` in `water_grid` (only the new ones)."""
+        count = int(numpy.searchsorted(self.arrival, t, side='right'))
+        if count > self.filled:
+            water_grid.array.reshape(-1)[self.order[self.filled:count]] = True
+            self.filled = count
+        return count
+
+    def water_grid(self, t):
+        """A new water grid of the cells flooded by time `t`."""
+        water_grid = WaterGrid(self.width, self.height, data=self.initial.tobytes())
+        water_grid.array.reshape(-1)[self.order[:numpy.searchsorted(self.arrival, t, side='right')]] = True
+        return water_grid
+
+    def frontier(self, t):
+        """The water queue at time `t`: flooded cells whose spread event has not left yet."""
+        waiting = (self.arrival <= t) & (self.pops > t)
+        frontier = FloodFrontier(self.width, self.height, max(int(waiting.sum()), 1))
+        frontier.extend(self.order[waiting], self.downward[waiting])
+        return frontier
+
+    def elapsed(self, t):
+        """The time already paid toward the next spread event at time `t`."""
+        popped = int(numpy.searchsorted(self.pops, t, side='right'))
+        return t - self.pops[popped - 1] if popped else t - self.start
+
+# Function to precompute the flood of a round
+def compute_flood_arrival(maze, water_grid, water_queue, water_parameters, rng=None, frame_time=1 / FPS):
+    """
+    Compute the arrival time of water at every cell from the current flood state.
+
+    This follows update_water: the queued events leave one after another, each
+    after paying its spread time (1 / rate plus a random jitter, plus an
+    occasional bonus that holds the water back), and each floods its dry
+    neighbours in a random direction order when it leaves. So a cell's arrival
+    time is the time the event that floods it leaves the queue, which is a
+    cumulative sum of spread times along the queue order. The queue is processed
+    one generation at a time with array operations. Times count from now, with
+    water_parameters['elapsed'] already paid toward the head event.
+
+    update_water draws the jitter and bonus of the event at the head of the
+    queue again on every frame, which the field reproduces for frames of
+    `frame_time` seconds. The event leaves on the first frame its fresh jitter
+    fits in the time paid so far, so the jitter it pays is drawn by stepping
+    through those frames. Each frame it waits also takes a bonus off the time
+    paid, 1 / 64 / rate on average (a bonus one time in eight, of 0.125 / rate
+    on average), so the time paid grows by frame_time - 1 / 64 / rate per frame
+    and the wait is longer by a factor 1 / (1 - 1 / (64 * rate * frame_time)).
+
+    Args:
+        maze: The maze grid.
+        water_grid: Grid of the cells already occupied by water.
+        water_queue: FloodFrontier of the pending water spread events.
+        water_parameters: Dictionary containing spread rates and other configurations.
+        rng: Source of random numbers with a `random(size)` method (default numpy.random).
+        frame_time: Duration of a frame in the game loop.
+    """
+    if rng is None:
+        rng = numpy.random
+
+    rate_normal = water_parameters['normal']
+    rate_downrard = water_parameters['downward']
+    neighbours = maze.water_neighbours()
+    initial = water_grid.array.reshape(-1).copy()
+    wet = initial.copy()
+
+    # The queued events are already flooded
+    events, downward = (array.copy() for array in water_queue.peek(len(water_queue)))
+    arrival = numpy.zeros(len(events))
+    clock = -water_parameters['elapsed']
+    start = clock
+    orders, arrivals, pops, downwards = [], [], [], []
+
+    while len(events):
+        # Time each event of this generation leaves the queue
+        spread_rate = numpy.where(downward, rate_downrard, rate_normal)
+        draws = rng.random((5, len(events)))
+        bonus = numpy.where(draws[1] * 0.25 > draws[2], draws[3] * 0.25 / spread_rate, 0.0)
+
+        # The jitter each event pays: past 1 / rate, every frame adds `step` (in units
+        # of 1 / rate) to the time paid and the event leaves on the first frame its
+        # fresh jitter fits. Jitters are drawn for every frame up to the one where the
+        # time paid passes 1, where any jitter fits.
+        step = numpy.maximum(spread_rate * frame_time - 1 / 64, 1 / 64)  # Kept positive for very slow floods
+        frames = int(numpy.ceil(1 / step.min())) + 1
+        paid = draws[0] * step + numpy.arange(frames)[:, None] * step
+        fresh = rng.random((frames, len(events)))
+        leaving = (fresh <= paid).argmax(axis=0)
+        cost = (1 + fresh[leaving, numpy.arange(len(events))]) / spread_rate
+
+        # The bonuses drawn while waiting stretch the time at the head of the queue
+        stretch = spread_rate * frame_time / step  # 1 / (1 - 1 / (64 * rate * frame_time))
+        leave = clock + numpy.cumsum((cost + bonus) * stretch)
+        clock = leave[-1]
+
+        orders.append(events)
+        arrivals.append(arrival)
+        pops.append(leave)
+        downwards.append(downward)
+
+        # The cells flooded by this generation make up the next one
+        events, downward, parents = neighbours.spread(events, draws[4], wet)
+        wet[events] = True
+        arrival = leave[parents]
+
+    if not orders:  # Nothing is queued, so nothing more floods
+        orders = [numpy.zeros(0, dtype=numpy.int64)]
+        arrivals = pops = [numpy.zeros(0)]
+        downwards = [numpy.zeros(0, dtype=numpy.bool_)]
+    return FloodField(maze.width, maze.height, numpy.concatenate(orders), numpy.concatenate(arrivals),
+                      numpy.concatenate(pops), numpy.concatenate(downwards), start, initial)
+
+# Directions used to carve the maze and every order of them
+CARVE_DIRECTIONS = ((0, 2), (2, 0), (0, -2), (-2, 0))
+CARVE_ORDERS = list(itertools.permutations(CARVE_DIRECTIONS))
+
+# Every order of the directions a dead-end branch can start in
+BRANCH_ORDERS = list(itertools.permutations(((-1, 0), (1, 0), (0, -1), (0, 1))))
+
+# Function to generate a maze using DFS
+def generate_maze(width, height, seed=None, difficulty=DEFAULT_DIFFICULTY, rng=None):
+    """
+    Generate a maze by depth-first carving and add dead ends by `difficulty`.
+
+    The random numbers come from `rng`, a RandomStream that the round's flood
+    can go on drawing from, or from a new RandomStream seeded by `seed`.
+    """
+    if rng is None:
+        rng = RandomStream(seed)
+    maze = MazeGrid(width, height)
+    cells = maze.data
+    start_x, start_y = 1, 1
+
+    # Every cell is carved once and shuffles its directions then, so the orders
+    # of all cells are drawn as one block up front
+    orders = iter(rng.integers(len(CARVE_ORDERS), max(1, (width - 1) // 2 * ((height - 1) // 2))).tolist())
+
+    # Carve passages with an explicit stack instead of recursion, so that large
+    # boards do not hit the recursion limit. Each frame keeps an iterator over its
+    # shuffled directions, so resuming a frame continues exactly where the
+    # recursive call would have.
+    cells[start_y * width + start_x] = CELL_PATH
+    stack = [(start_x, start_y, iter(CARVE_ORDERS[next(orders)]))]
+    while stack:
+        x, y, directions = stack[-1]
+        for dx, dy in directions:
+            nx, ny = x + dx, y + dy
+            if 1 <= nx < width - 1 and 1 <= ny < height - 1 and cells[ny * width + nx] == CELL_WALL:
+                cells[ny * width + nx] = CELL_PATH
+                cells[(y + dy // 2) * width + x + dx // 2] = CELL_PATH
+                stack.append((nx, ny, iter(CARVE_ORDERS[next(orders)])))
+                break
+        else:
+            stack.pop()
+
+    maze.set(width - 2, height - 2, CELL_EXIT)  # Mark the exit
+
+    # Find the solution path to protect it when adding dead ends
+    solution_path = find_solution_path(maze, (start_x, start_y), (width - 2, height - 2))
+
+    # Add dead ends based on difficulty without modifying the solution path
+    add_dead_end_branches(maze, difficulty, solution_path, rng)
+    return maze
+
+# Function to find the solution path using BFS
+def find_solution_path(maze, start, end):
+    finder = maze.path_finder()
+    path = finder.bfs(maze.index(*start), maze.index(*end))
+    return set(finder.position(i) for i in path)  # Return the solution path as a set for quick lookup
+
+# Function to add dead-end branches to the maze without affecting the solution path
+def add_dead_end_branches(maze, difficulty, solution_path, rng=None):
+    """
+    Adds dead-end branches to the maze to increase difficulty.
+    The number and length of branches are determined by the difficulty level.
+    Random numbers come from `rng` (a RandomStream, default unseeded).
+    """
+    if rng is None:
+        rng = RandomStream()
+    num_branches = min(difficulty, 100)  # Cap the number of branches to prevent over-fragmentation
+    width, height, cells = maze.width, maze.height, maze.data
+    branch_length_range = max(1, min(difficulty // 10, 10))  # Adjust branch length based on difficulty
+
+    # Walk the solution path in row-major order, i.e. by flat index, rather than scanning every cell
+    potential_branch_points = [
+        i for i in sorted(y * width + x for x, y in solution_path)
+        if 1 <= i % width < width - 1 and 1 <= i // width < height - 1 and cells[i] == CELL_PATH
+    ]
+
+    shuffle = numpy.argsort(rng.random(len(potential_branch_points)), kind='stable')
+    potential_branch_points = [potential_branch_points[n] for n in shuffle.tolist()]
+
+    branches_added = 0
+
+    for i in potential_branch_points:
+        if branches_added >= num_branches:
+            break
+        x, y = i % width, i // width
+
+        # Possible directions to branch off (ensure they don't go back into the solution path)
+        directions = BRANCH_ORDERS[int(rng.random() * len(BRANCH_ORDERS))]
+
+        for dx, dy in directions:
+            nx, ny = x + dx, y + dy
+            if (1 <= nx < width - 1 and 1 <= ny < height - 1 and cells[ny * width + nx] == CELL_WALL):
+                # Carve a new branch
+                cells[ny * width + nx] = CELL_PATH
+                cells[(y + dy // 2) * width + x + dx // 2] = CELL_PATH
+
+                # Determine the length of the branch
+                branch_length = 1 + int(rng.random() * branch_length_range)
+
+                current_x, current_y = nx, ny
+                branch_successful = True
+
+                for _ in range(branch_length):
+                    # Choose a new direction for the branch, avoiding reversing
+                    possible_dirs = [d for d in directions if d != (-dx, -dy)]
+                    if not possible_dirs:
+                        break
+                    branch_dir = possible_dirs[int(rng.random() * len(possible_dirs))]
+                    bdx, bdy = branch_dir
+                    next_x, next_y = current_x + bdx, current_y + bdy
+
+                    # Check if the next cell is available for carving
+                    if (1 <= next_x < width - 1 and 1 <= next_y < height - 1 and
+                        cells[next_y * width + next_x] == CELL_WALL):
+
+                        # Ensure that carving here doesn't create a loop
+                        if count_wall_neighbors(maze, next_x, next_y) >= 3:
+                            cells[next_y * width + next_x] = CELL_PATH
+                            cells[(current_y + bdy // 2) * width + current_x + bdx // 2] = CELL_PATH
+                            current_x, current_y = next_x, next_y
+                        else:
+                            branch_successful = False
+                            break
+                    else:
+                        branch_successful = False
+                        break
+
+                # Terminate the branch to make it a dead end
+                # No action needed since the loop stops carving further
+
+                branches_added += 1
+                break  # Move to the next branch point after adding one branch
+
+# Function to count wall neighbors
+def count_wall_neighbors(maze, x, y):
+    """Helper function to count how many neighboring cells are walls."""
+    width, cells = maze.width, maze.data
+    count = 0
+    for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+        nx, ny = x + dx, y + dy
+        if cells[ny * width + nx] == CELL_WALL:
+            count += 1
+    return count
+
+# Adjust move range dynamically based on path type
+def adjust_move_range(maze, player_pos):
+    x, y = player_pos
+    straight_paths = 0
+
+    for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < maze.width and 0 <= ny < maze.height and maze.get(nx, ny) == CELL_PATH:
+            straight_paths += 1
+
+    if straight_paths == 2:  # Path is a corner
+        return int(DEFAULT_MOVE_RANGE * 0.5)
+    elif straight_paths >= 3:  # Path is straight with more options
+        return int(DEFAULT_MOVE_RANGE * 1.2)
+    return DEFAULT_MOVE_RANGE
+
+# Cache of the cells the player can click-move to
+class ReachCache:
+    """
+    Distances and BFS parents of the cells within the move range of one player
+    position, found with a single bounded search.
+
+    Click-to-move paths, the move range and the reachable cells then become
+    dictionary lookups. `update` only searches again when the player has moved
+    or the maze object changed; call `invalidate` after editing a maze in place.
+    """
+    def __init__(self):
+        self.maze = None
+        self.position = None
+        self.move_range = 0
+        self.parents = {}    # Flat index -> flat index of the previous cell (-1 for the start)
+        self.distances = {}  # Flat index -> number of steps from the player
+
+    def update(self, maze, player_pos):
+        """Make the cache describe `player_pos` in `maze` and return it."""
+        position = tuple(player_pos)
+        if maze is self.maze and position == self.position:
+            return self
+        self.maze = maze
+        self.position = position
+        self.move_range = adjust_move_range(maze, position)
+
+        # Same search order as find_path_within_range, so paths are the same too
+        finder = maze.path_finder()
+        start = maze.index(*position)
+        count = finder.reachable(start, self.move_range, RANGE_DIRECTIONS)
+        parent = finder.parent
+        self.parents = {i: parent[i] for i in finder.visited(count)}
+        distances = {start: 0}
+        for i in finder.visited(count, 1):  # Parents always come before their children
+            distances[i] = distances[parent[i]] + 1
+        self.distances = distances
+        return self
+
+    def invalidate(self):
+        self.maze = None
+
+    def distance(self, x, y):
+        """Steps from the player to (x, y), or None if it is out of range."""
+        if not self.maze.in_bounds(x, y):
+            return None
+        return self.distances.get(self.maze.index(x, y))
+
+    def path_to(self, x, y):
+        """The path from the player to (x, y) as (x, y) tuples, or [] if out of range."""
+        if self.distance(x, y) is None:
+            return []
+        width = self.maze.width
+        path = []
+        i = self.maze.index(x, y)
+        while i >= 0:
+            path.append((i % width, i // width))
+            i = self.parents[i]
+        path.reverse()
+        return path
+
+    def cells(self):
+        """The reachable cells as (x, y) tuples, nearest first."""
+        width = self.maze.width
+        return [(i % width, i // width) for i in self.distances]
+
+# Check if the player encounters the water
+def check_player_collision(player_pos, water_grid, flood_field=None, flood_time=0.0):
+    """Check if the player has collided with water."""
+    x, y = player_pos
+    if flood_field is not None:
+        return bool(flood_field.is_wet(x, y, flood_time))  # One lookup in the arrival times
+    if water_grid.get(x, y):
+        return True
+    return False
+
+# Water speed schedule
+def water_speed_schedule(water_parameters, round_num):
+    # Calculate next water_speed
+    if water_parameters is not None:
+        water_parameters['normal'] = WATER_SPREAD_RATE_NORMAL * numpy.log(numpy.exp(1) + round_num)
+        water_parameters['downward'] = WATER_SPREAD_RATE_DOWNWARD * numpy.log(numpy.exp(1) + round_num)
+    return water_parameters
+    
+
+# One round of the game without rendering or input handling
+class RoundState:
+    """
+    The maze, player and flood of one round, stepped by `advance`.
+
+    The simulation runs in fixed ticks (`tick`): the flood advances by one time
+    step, the player moves queued since the last tick are made and the player
+    walks on along a clicked path (`walk`), then the round is checked for a win
+    or a flood. The game runs ticks for the time between its
+    frames (see TickClock); replays, bots and tests run them back to back with
+    `run`. The round evolves identically given the same time steps, moves and
+    random generator, whatever the frame rate.
+
+    Args:
+        maze: The maze grid of the round.
+        round_count: Round number, which sets the water speed.
+        rng: RandomStream of the round, saved with the game (default numpy.random).
+        flood_mode: 'queue' spreads water every step, 'arrival' precomputes the flood.
+        water_grid: empty water grid to flood, e.g. a memory-mapped one for a
+            giant maze (default: a new WaterGrid).
+    """
+    def __init__(self, maze, round_count=1, rng=None, flood_mode='queue', water_grid=None):
+        self.maze = maze
+        self.round_count = round_count
+        self.rng = rng
+        self.flood_mode = flood_mode
+        self.player_pos = [1, 1]
+        self.end_pos = (maze.width - 2, maze.height - 2)
+        self.water_time = 0
+        self.water_grid = water_grid if water_grid is not None else initialize_water_grid(maze.width, maze.height)
+        self.water_queue = FloodFrontier(maze.width, maze.height)
+        self.water_parameters = water_speed_schedule({'elapsed': 0,
+                                                      'normal': WATER_SPREAD_RATE_NORMAL,
+                                                      'downward': WATER_SPREAD_RATE_DOWNWARD,
+                                                      'round_count': round_count}, round_count)
+        self.water_initial_place = (1, 1)
+        self.flood_field = None  # Precomputed flood, in the 'arrival' flood mode
+        self.flood_time = 0.0
+        self.prepared_flood = None  # (flood field, generator state after it) from prepare_flood
+        self.tick_count = 0
+        self.pending_moves = []   # (x, y) moves to make on the next tick
+        self.walk_path = deque()  # Cells of a clicked path still to walk
+        self.walk_time = 0.0      # Time spent toward the next cell of the path
+        self.previous_pos = (1, 1)  # Player position before the last tick, for interpolated drawing
+        self.outcome = None       # 'won' or 'flooded' once a tick decided the round
+
+    def set_round_count(self, round_count):
+        """Use the water speed of another round number, e.g. after the player was flooded."""
+        if round_count != self.round_count:
+            self.round_count = round_count
+            self.water_parameters = water_speed_schedule(dict(self.water_parameters, round_count=round_count),
+                                                         round_count)
+            self.prepared_flood = None  # It was computed for the other speed
+
+    def prepare_flood(self):
+        """
+        In the 'arrival' mode, compute the flood the round will start ahead of
+        time, from copies of the start state and of the random generator. The
+        round uses it instead of computing it when the water appears, and the
+        generator is then moved on as if it had been computed there.
+        """
+        if self.flood_mode != 'arrival' or self.rng is None:
+            return
+        rng = RandomStream.from_state(self.rng.get_state())
+        water_grid = self.water_grid.copy()
+        water_queue = FloodFrontier(self.maze.width, self.maze.height)
+        initialize_water(water_grid, water_queue, self.water_initial_place)
+        flood_field = compute_flood_arrival(self.maze, water_grid, water_queue, dict(self.water_parameters), rng)
+        self.prepared_flood = (flood_field, rng.get_state())
+
+    def restore(self, player_pos, elapsed_time, water_grid, water_queue, water_parameters):
+        """Continue from a saved game state (see decode_game_state), with its random stream if saved."""
+        water_parameters = dict(water_parameters)
+        rng_state = water_parameters.pop('rng_state', None)
+        if rng_state is not None and self.rng is not None:
+            self.rng.set_state(rng_state)
+        self.player_pos = list(player_pos)
+        self.water_grid = water_grid
+        self.water_queue = water_queue
+        self.water_parameters = water_parameters
+        self.round_count = water_parameters['round_count']
+        self.flood_field = None
+        self.water_time = self.water_time + elapsed_time
+
+    def advance(self, delta_time):
+        """Let `delta_time` seconds of the flood pass."""
+        self.water_time += delta_time
+
+        # This is the delayed water appearance
+        if self.water_time > WATER_SPREAD_DELAY:
+            if len(self.water_queue) == 0 and self.flood_field is None:
+                initialize_water(self.water_grid, self.water_queue, self.water_initial_place)
+            elif self.flood_mode == 'arrival':
+                # Compute the rest of the flood once, then only look up arrival times
+                if self.flood_field is None and self.prepared_flood is not None:
+                    self.flood_field, rng_state = self.prepared_flood
+                    self.rng.set_state(rng_state)
+                    self.prepared_flood = None
+                    self.flood_time = 0.0
+                elif self.flood_field is None:
+                    self.flood_field = compute_flood_arrival(self.maze, self.water_grid, self.water_queue,
+                                                             self.water_parameters, self.rng)
+                    self.flood_time = 0.0
+                self.flood_time += delta_time
+                self.flood_field.fill(self.water_grid, self.flood_time)
+            else:
+                update_water(self.maze, self.water_grid, self.water_queue, delta_time, self.water_parameters, self.rng)
+
+    def move_player(self, x, y):
+        self.player_pos[0], self.player_pos[1] = x, y
+
+    def queue_move(self, x, y):
+        """Move the player to (x, y) on the next tick (and stop walking)."""
+        self.pending_moves.append((x, y))
+
+    def walk(self, path):
+        """
+        Walk `path` (a list of (x, y) cells from the player's cell) from the next
+        tick on, one cell every MOVE_STEP_SECONDS. Replaces the path walked so far.
+        """
+        self.walk_path = deque(tuple(cell) for cell in path[1:])
+        self.walk_time = 0.0
+
+    def walking(self):
+        return bool(self.walk_path)
+
+    def step_walk(self, delta_time):
+        # Every cell passed is checked, so the player cannot walk through water
+        self.walk_time += delta_time
+        while self.walk_path and self.walk_time >= MOVE_STEP_SECONDS:
+            self.walk_time -= MOVE_STEP_SECONDS
+            self.move_player(*self.walk_path.popleft())
+            if self.flooded() or self.won():
+                self.walk_path.clear()
+
+    def tick(self, delta_time=TICK_SECONDS):
+        """Run one tick of `delta_time` seconds and return the outcome (None while playing)."""
+        self.previous_pos = tuple(self.player_pos)
+        self.advance(delta_time)
+        if self.pending_moves:
+            self.walk_path.clear()  # Dragging takes over from a click
+        for x, y in self.pending_moves:
+            self.move_player(x, y)
+        self.pending_moves.clear()
+        if self.walk_path:
+            self.step_walk(delta_time)
+        self.tick_count += 1
+
+        # Being flooded beats reaching the exit in the same tick
+        if self.flooded():
+            self.outcome = 'flooded'
+        elif self.won():
+            self.outcome = 'won'
+        return self.outcome
+
+    def run(self, ticks, delta_time=TICK_SECONDS):
+        """
+        Fast-forward up to `ticks` ticks as fast as possible, stopping early when
+        the round is decided. Return the number of ticks run.
+        """
+        for count in range(ticks):
+            if self.tick(delta_time) is not None:
+                return count + 1
+        return ticks
+
+    def won(self):
+        return tuple(self.player_pos) == self.end_pos
+
+    def flooded(self):
+        return check_player_collision(self.player_pos, self.water_grid, self.flood_field, self.flood_time)
+
+    def water_state(self):
+        """
+        The (water_grid, water_queue, water_parameters) to save, also in the
+        'arrival' mode. The parameters also carry the random stream's state.
+        """
+        water_queue, water_parameters = self.water_queue, dict(self.water_parameters)
+        if self.flood_field is not None:
+            # The queue as it stands at this point of the precomputed flood
+            water_queue = self.flood_field.frontier(self.flood_time)
+            water_parameters['elapsed'] = float(self.flood_field.elapsed(self.flood_time))
+        if self.rng is not None:
+            water_parameters['rng_state'] = self.rng.get_state()
+        return self.water_grid, water_queue, water_parameters
+
+# Fixed-timestep clock of the simulation
+class TickClock:
+    """
+    Turns the variable time between frames into whole ticks of `tick` seconds,
+    carrying the remainder over to the next frame. At most `max_ticks` run per
+    frame and the time beyond is dropped, so a stall (a file dialog, a
+    notification) does not make the flood jump ahead when the game resumes.
+    """
+    def __init__(self, tick=TICK_SECONDS, max_ticks=MAX_FRAME_TICKS):
+        self.tick = tick
+        self.max_ticks = max_ticks
+        self.accumulator = 0.0
+
+    def ticks(self, frame_time):
+        """Return the number of ticks to run for a frame that took `frame_time` seconds."""
+        self.accumulator += frame_time
+        count = int(self.accumulator / self.tick)
+        if count > self.max_ticks:
+            count = self.max_ticks
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= count * self.tick
+        return count
+
+    def alpha(self):
+        """How far the time is between the last tick and the next one, from 0 to 1."""
+        return min(self.accumulator / self.tick, 1.0)
+
+# Function to prepare a round
+def prepare_round(width, height, seed, difficulty=DEFAULT_DIFFICULTY, round_count=1, flood_mode='queue',
+                  cache_dir=None):
+    """
+    Generate the maze of a round and its RoundState, with the flood going on
+    from the random stream the maze was generated with (seeded by the round's
+    seed) and precomputed in the 'arrival' mode. The result can be pickled, so
+    this can run in a worker process.
+
+    Args:
+        cache_dir: take the maze and flood from the maze cache in this
+            directory (see maze_cache), storing them there on a miss.
+    """
+    if cache_dir is not None:
+        from maze_cache import open_cache  # maze_cache builds on this module
+        return open_cache(cache_dir).prepare_round(width, height, seed, difficulty, round_count, flood_mode)
+    rng = RandomStream(seed)
+    maze = generate_maze(width, height, difficulty=difficulty, rng=rng)
+    state = RoundState(maze, round_count, rng, flood_mode)
+    state.prepare_flood()
+    return state
+
+# Prepares upcoming rounds in a worker process
+class RoundPrefetcher:
+    """
+    Runs prepare_round for the next round in a worker process while the current
+    round is played, so that starting it only means picking up the result.
+    The worker is spawned (not forked from the game) on first use.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.executor = None
+        self.future = None
+        self.key = None
+
+    def start(self, width, height, seed, difficulty=DEFAULT_DIFFICULTY, round_count=1, flood_mode='queue',
+              cache_dir=None):
+        """Start preparing a round, dropping any other round being prepared."""
+        if not self.enabled:
+            return
+        if self.executor is None:
+            # Imported here so scripts using the engine alone do not load them
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # A spawned worker starts clean instead of a fork of a process running
+            # pygame, SDL and Tk (which macOS and some SDL backends do not allow)
+            self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        if self.future is not None:
+            self.future.cancel()
+        self.key = (width, height, seed, difficulty, flood_mode)
+        self.future = self.executor.submit(prepare_round, width, height, seed, difficulty, round_count, flood_mode,
+                                           cache_dir)
+
+    def take(self, width, height, seed, difficulty=DEFAULT_DIFFICULTY, round_count=1, flood_mode='queue',
+             cache_dir=None):
+        """
+        Return the prepared RoundState of this round, waiting for it if it is
+        not done yet, or prepare it now if another round was being prepared.
+        """
+        future, self.future = self.future, None
+        if future is not None and self.key == (width, height, seed, difficulty, flood_mode):
+            try:
+                state = future.result()
+                state.set_round_count(round_count)
+                return state
+            except Exception:
+                pass  # E.g. the worker died; prepare the round here instead
+        elif future is not None:
+            future.cancel()
+        return prepare_round(width, height, seed, difficulty, round_count, flood_mode, cache_dir)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+# Convert a game state to a JSON-serializable dictionary
+def encode_game_state(player_pos, maze, seed, time_elapsed, difficulty, water_grid, water_queue, water_parameters):
+    return {
+        "player_pos": list(player_pos),
+        "maze": maze.to_list(),  # Keep the legacy nested-list layout in JSON saves
+        "seed": seed,
+        "time_elapsed": time_elapsed,
+        "difficulty": difficulty,
+        "water_grid": water_grid.to_list(),
+        "water_queue": list(water_queue),  # Convert the frontier to a list for JSON serialization
+        "water_parameters": water_parameters
+    }
+
+# Convert a dictionary loaded from a JSON save back to a game state
+def decode_game_state(game_state):
+    """
+    Return the game state as a tuple of (player_pos, maze, seed, time_elapsed,
+    difficulty, water_grid, water_queue, water_parameters).
+    """
+    maze = MazeGrid.from_list(game_state["maze"])
+    return (
+        game_state["player_pos"],
+        maze,
+        game_state["seed"],
+        game_state["time_elapsed"],
+        game_state["difficulty"],
+        WaterGrid.from_list(game_state["water_grid"]),
+        FloodFrontier.from_list(game_state["water_queue"], maze.width, maze.height),
+        game_state["water_parameters"]
+    )
+
+# Binary save format: magic, version, flags and the length of the JSON metadata
+SAVE_MAGIC = b'AMAZ'
+SAVE_VERSION = 1
+SAVE_FLAG_ZLIB = 1
+SAVE_HEADER = struct.Struct('<4sHHI')
+
+# Function to pack a game state into the binary save format
+def pack_game_state(player_pos, maze, seed, time_elapsed, difficulty, water_grid, water_queue, water_parameters,
+                    compress=True):
+    """
+    Return the game state as bytes in the binary save format.
+
+    After the header come the scalar fields as JSON, then the maze as two bit
+    planes of its cell codes, the water grid as one bit plane, and the pending
+    water events as little-endian uint32 flat cell indices followed by their
+    downward flags as bits. Everything after the header is zlib-compressed when
+    `compress` is set.
+    """
+    if isinstance(water_queue, FloodFrontier):
+        events, downward = water_queue.peek(len(water_queue))
+    else:
+        water_queue = FloodFrontier.from_list(list(water_queue), maze.width, maze.height)
+        events, downward = water_queue.peek(len(water_queue))
+    meta = json.dumps({
+        "player_pos": list(player_pos),
+        "width": maze.width,
+        "height": maze.height,
+        "seed": seed,
+        "time_elapsed": time_elapsed,
+        "difficulty": difficulty,
+        "water_events": len(events),
+        "water_parameters": water_parameters
+    }).encode()
+    cells = maze.array.reshape(-1)
+    body = b''.join([
+        meta,
+        numpy.packbits(cells & 1).tobytes(),
+        numpy.packbits(cells >> 1 & 1).tobytes(),
+        numpy.packbits(water_grid.array.reshape(-1)).tobytes(),
+        events.astype('<u4').tobytes(),
+        numpy.packbits(downward).tobytes()
+    ])
+    flags = 0
+    if compress:
+        body = zlib.compress(body, 6)
+        flags |= SAVE_FLAG_ZLIB
+    return SAVE_HEADER.pack(SAVE_MAGIC, SAVE_VERSION, flags, len(meta)) + body
+
+# Function to unpack a game state from the binary save format
+def unpack_game_state(data):
+    """
+    Return the game state packed by pack_game_state, as the same tuple as
+    decode_game_state. Raises ValueError if the data is not a supported save.
+    """
+    if len(data) < SAVE_HEADER.size:
+        raise ValueError("Save data is truncated")
+    magic, version, flags, meta_size = SAVE_HEADER.unpack_from(data)
+    if magic != SAVE_MAGIC:
+        raise ValueError("Not a binary maze save")
+    if version > SAVE_VERSION:
+        raise ValueError("Save format version %d is newer than this game supports" % version)
+    body = memoryview(data)[SAVE_HEADER.size:]
+    if flags & SAVE_FLAG_ZLIB:
+        try:
+            body = memoryview(zlib.decompress(body))
+        except zlib.error as error:
+            raise ValueError("Save data is corrupted: %s" % error)
+
+    meta = json.loads(bytes(body[:meta_size]))
+    width, height, count = meta["width"], meta["height"], meta["water_events"]
+    size = width * height
+    grid_bytes = (size + 7) // 8
+    offsets = numpy.cumsum([meta_size, grid_bytes, grid_bytes, grid_bytes, 4 * count, (count + 7) // 8])
+    if len(body) != offsets[-1]:
+        raise ValueError("Save data is truncated")
+
+    def bits(start, end, length):
+        return numpy.unpackbits(numpy.frombuffer(body[start:end], dtype=numpy.uint8), count=length)
+
+    cells = bits(offsets[0], offsets[1], size) | bits(offsets[1], offsets[2], size) << 1
+    maze = MazeGrid(width, height, data=cells.tobytes())
+    water_grid = WaterGrid(width, height, data=bits(offsets[2], offsets[3], size).tobytes())
+    water_queue = FloodFrontier(width, height, max(count, 1))
+    water_queue.extend(numpy.frombuffer(body[offsets[3]:offsets[4]], dtype='<u4').astype(numpy.int64),
+                       bits(offsets[4], offsets[5], count).astype(numpy.bool_))
+    return (
+        meta["player_pos"],
+        maze,
+        meta["seed"],
+        meta["time_elapsed"],
+        meta["difficulty"],
+        water_grid,
+        water_queue,
+        meta["water_parameters"]
+    )
+
+# Function to write a game state to a file
+def write_game_state(path, player_pos, maze, seed, time_elapsed, difficulty, water_grid, water_queue,
+                     water_parameters, compress=True):
+    """Write a save file: legacy JSON if `path` ends with .json, otherwise the binary format."""
+    if path.lower().endswith('.json'):
+        game_state = encode_game_state(player_pos, maze, seed, time_elapsed, difficulty,
+                                       water_grid, water_queue, water_parameters)
+        with open(path, 'w') as file:
+            json.dump(game_state, file)
+    else:
+        with open(path, 'wb') as file:
+            file.write(pack_game_state(player_pos, maze, seed, time_elapsed, difficulty,
+                                       water_grid, water_queue, water_parameters, compress))
+
+# Function to read a game state from a file
+def read_game_state(path):
+    """
+    Read a binary or legacy JSON save file and return the game state tuple.
+    Raises ValueError if the file is neither.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if data.startswith(SAVE_MAGIC):
+        return unpack_game_state(data)
+    return decode_game_state(json.loads(data))
+
+# Function to copy the parts of a game state that change as the round goes on
+def snapshot_game_state(player_pos, maze, seed, time_elapsed, difficulty, water_grid, water_queue, water_parameters):
+    """
+    Return the game state with the player position, water grid, water queue
+    and water parameters copied, so that it can be saved on another thread
+    while the round goes on. The maze does not change during a round and is
+    shared.
+    """
+    if not isinstance(water_queue, FloodFrontier):
+        water_queue = FloodFrontier.from_list(list(water_queue), maze.width, maze.height)
+    return (list(player_pos), maze, seed, time_elapsed, difficulty, water_grid.copy(), water_queue.copy(),
+            copy.deepcopy(water_parameters))
+
+# Saves and loads games in a background thread
+class SaveWorker:
+    """
+    Runs write_game_state and read_game_state in a worker thread, so that
+    packing, compressing and writing a large save does not stall the game loop.
+    Both return a concurrent.futures.Future; one worker runs them in the order
+    they were asked for. The worker is started on first use.
+    """
+    def __init__(self):
+        self.executor = None
+
+    def submit(self, function, *args):
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor  # Only loaded by the game
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save")
+        return self.executor.submit(function, *args)
+
+    def save(self, path, player_pos, maze, seed, time_elapsed, difficulty, water_grid, water_queue, water_parameters,
+             compress=True):
+        """Write a snapshot of the game state, taken now, to `path`."""
+        snapshot = snapshot_game_state(player_pos, maze, seed, time_elapsed, difficulty, water_grid, water_queue,
+                                       water_parameters)
+        return self.submit(write_game_state, path, *snapshot, compress)
+
+    def load(self, path):
+        """Read the game state in `path`; the future's result is the game state tuple."""
+        return self.submit(read_game_state, path)
+
+    def shutdown(self):
+        """Finish the saves still pending and stop the worker."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
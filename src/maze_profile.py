@@ -0,0 +1,103 @@
+'''
+Floating Maze - frame profiler
+Version 20241111
+Copyright: DOF Studio
+
+Times the stages of every frame of the main loop, summarizes them as
+percentiles for the on-screen overlay, and records a timeline that can be
+exported in the Chrome trace format (open it in chrome://tracing or Perfetto).
+'''
+
+import os
+import json
+import time
+from collections import deque
+
+# Per-frame stage timer
+class FrameProfiler:
+    """
+    The main loop calls `begin_frame`, then `mark(stage)` after each stage and
+    `end_frame` at the end; a stage is the time since the previous mark.
+
+    The profiler times frames while its overlay is `visible` or a timeline is
+    being recorded; otherwise `begin_frame`, `mark` and `end_frame` are bound
+    to a function that does nothing, so the loop only pays for the calls.
+
+    Args:
+        history: number of recent frames the percentiles are computed over.
+    """
+    def __init__(self, history=600):
+        self.frames = deque(maxlen=history)  # (frame time, {stage: time}) of recent frames
+        self.trace = None                    # Chrome trace events, when recording a timeline
+        self.origin = time.perf_counter()
+        self.visible = False                 # Whether the game shows the overlay
+        self.enabled = False
+        self.bind()
+
+    def bind(self):
+        """Bind the timing methods if the overlay is shown or a timeline is recorded, else the no-ops."""
+        self.enabled = self.visible or self.trace is not None
+        if self.enabled:
+            self.begin_frame = self._begin_frame
+            self.mark = self._mark
+            self.end_frame = self._end_frame
+        else:
+            self.begin_frame = self.mark = self.end_frame = _ignore
+            self.frames.clear()
+
+    def show(self, visible=True):
+        """Show or hide the overlay; hiding it does not stop a timeline being recorded."""
+        self.visible = visible
+        self.bind()
+
+    def start_trace(self):
+        """Record a timeline of every frame from now on, whether the overlay is shown or not."""
+        self.trace = []
+        self.bind()
+
+    def _begin_frame(self):
+        self.frame_start = self.last = time.perf_counter()
+        self.stages = {}
+
+    def _mark(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        if self.trace is not None:
+            self.trace.append({"name": stage, "ph": "X", "pid": os.getpid(), "tid": 1,
+                               "ts": (self.last - self.origin) * 1e6, "dur": (now - self.last) * 1e6})
+        self.last = now
+
+    def _end_frame(self):
+        now = time.perf_counter()
+        self.frames.append((now - self.frame_start, self.stages))
+        if self.trace is not None:
+            self.trace.append({"name": "frame", "ph": "X", "pid": os.getpid(), "tid": 0,
+                               "ts": (self.frame_start - self.origin) * 1e6, "dur": (now - self.frame_start) * 1e6})
+
+    def percentiles(self, points=(50, 95, 99)):
+        """
+        Return [(name, [milliseconds at each percentile])] for the whole frame
+        and every stage over the recent frames, slowest stage first.
+        """
+        if not self.frames:
+            return []
+        names = {}
+        for _, stages in self.frames:
+            names.update(dict.fromkeys(stages))
+        rows = [("frame", sorted(frame for frame, _ in self.frames))]
+        for name in names:
+            rows.append((name, sorted(stages.get(name, 0.0) for _, stages in self.frames)))
+        summary = []
+        for name, times in rows:
+            summary.append((name, [times[min(len(times) - 1, len(times) * point // 100)] * 1000 for point in points]))
+        summary[1:] = sorted(summary[1:], key=lambda row: -row[1][-1])
+        return summary
+
+    def export_trace(self, path):
+        """Write the recorded timeline as a Chrome trace JSON file."""
+        with open(path, "w") as file:
+            json.dump({"traceEvents": self.trace or [], "displayTimeUnit": "ms"}, file)
+
+# Stand-in for the profiler methods while it is disabled
+def _ignore(*args):
+    pass
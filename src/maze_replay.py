@@ -0,0 +1,243 @@
+'''
+Floating Maze - replay log
+Version 20241111
+Copyright: DOF Studio
+
+A run is recorded as events rather than snapshots: for every round the seed,
+difficulty and the state of the round's RandomStream, the time step of
+every tick and the player's moves. Keyframes of the flood are taken every few
+seconds, so a replay can seek to any tick by restoring the nearest keyframe
+and fast-forwarding without a window.
+
+Usage: python maze_replay.py RUN.amzr [--round N] [--time SECONDS]
+'''
+
+import io
+import json
+import argparse
+import numpy
+from maze_engine import RandomStream, RoundState, generate_maze, pack_game_state, unpack_game_state
+
+# Version of the replay file layout
+REPLAY_VERSION = 3  # 3: the flood's bonus holds the water back again, as before the batched update_water
+
+# Ticks between keyframes (10 seconds at 60 FPS)
+KEYFRAME_INTERVAL = 600
+
+# Record of one round
+class ReplayRound:
+    """
+    The events of one round. Ticks are numbered from 0; a keyframe taken at
+    tick k holds the state after k ticks. A round loaded from a save starts
+    from a keyframe at tick 0 instead of its seed.
+    """
+    def __init__(self, seed, width, height, difficulty, round_count, rng_state, flood_mode):
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.difficulty = difficulty
+        self.round_count = round_count
+        self.rng_state = rng_state
+        self.flood_mode = flood_mode
+        self.steps = []      # Time step of every tick, in milliseconds
+        self.moves = []      # (tick, x, y) of every player move
+        self.keyframes = []  # (tick, packed game state, water_time, rng state)
+        self.outcome = None  # 'won', 'flooded', or None if the run stopped during the round
+
+    def initial_state(self):
+        """The RoundState at tick 0."""
+        if self.keyframes and self.keyframes[0][0] == 0:
+            return self.restore_keyframe(self.keyframes[0])
+        maze = generate_maze(self.width, self.height, self.seed, self.difficulty)
+        return RoundState(maze, self.round_count, RandomStream.from_state(self.rng_state), self.flood_mode)
+
+    def restore_keyframe(self, keyframe):
+        tick, data, water_time, rng_state = keyframe
+        player_pos, maze, _, _, _, water_grid, water_queue, water_parameters = unpack_game_state(data)
+        state = RoundState(maze, water_parameters['round_count'], RandomStream.from_state(rng_state), self.flood_mode)
+        state.restore(player_pos, water_time, water_grid, water_queue, water_parameters)
+        return state
+
+# Recorder of a run
+class ReplayRecorder:
+    """
+    Collects the rounds of a run. Per tick the game calls `step` with the tick's
+    time step before running it, and `end_tick` after it.
+    """
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.rounds = []
+        self.residual = 0.0  # Milliseconds not yet handed out by `step`
+
+    def start_round(self, seed, difficulty, state, loaded=False):
+        """
+        Start recording `state` at its first tick. A round that was `loaded`
+        from a save is stored as a keyframe, the others by seed.
+        """
+        rng_state = state.rng.get_state()
+        self.current = ReplayRound(seed, state.maze.width, state.maze.height, difficulty,
+                                   state.round_count, rng_state, state.flood_mode)
+        if loaded:
+            self.keyframe(state)
+        self.last_pos = tuple(state.player_pos)
+        self.rounds.append(self.current)
+
+    def step(self, delta_time):
+        """
+        Record the time step of a tick and return it rounded to milliseconds,
+        which is what the round must be advanced by. Rounding errors are carried
+        over, so no time is lost.
+        """
+        self.residual += delta_time * 1000
+        step = max(int(round(self.residual)), 0)
+        self.residual -= step
+        self.current.steps.append(step)
+        return step / 1000
+
+    def end_tick(self, state):
+        """Record the player's move in this tick and take a keyframe when one is due."""
+        tick = len(self.current.steps)
+        position = tuple(state.player_pos)
+        if position != self.last_pos:
+            self.current.moves.append((tick - 1, position[0], position[1]))
+            self.last_pos = position
+        if tick % self.keyframe_interval == 0:
+            self.keyframe(state)
+
+    def keyframe(self, state):
+        # A precomputed flood cannot be restored from the water state, so the
+        # 'arrival' mode only keeps the keyframes from before it was computed
+        if state.flood_field is not None:
+            return
+        water_grid, water_queue, water_parameters = state.water_state()
+        data = pack_game_state(state.player_pos, state.maze, self.current.seed, 0, self.current.difficulty,
+                               water_grid, water_queue, water_parameters)
+        self.current.keyframes.append((len(self.current.steps), data, state.water_time,
+                                       state.rng.get_state()))
+
+    def end_round(self, outcome):
+        self.current.outcome = outcome
+
+    def save(self, path):
+        save_replay(path, self.rounds)
+
+# Function to write the rounds of a run to a replay file
+def save_replay(path, rounds):
+    """Write the rounds as a compressed .npz archive with a JSON index."""
+    index = {"version": REPLAY_VERSION, "rounds": []}
+    arrays = {}
+    for n, replay_round in enumerate(rounds):
+        keyframes = replay_round.keyframes
+        index["rounds"].append({
+            "seed": replay_round.seed,
+            "width": replay_round.width,
+            "height": replay_round.height,
+            "difficulty": replay_round.difficulty,
+            "round_count": replay_round.round_count,
+            "rng_state": replay_round.rng_state,
+            "flood_mode": replay_round.flood_mode,
+            "outcome": replay_round.outcome,
+            "keyframes": [(tick, water_time, rng_state) for tick, _, water_time, rng_state in keyframes]
+        })
+        arrays["steps_%d" % n] = numpy.array(replay_round.steps, dtype=numpy.uint16)
+        arrays["moves_%d" % n] = numpy.array(replay_round.moves, dtype=numpy.int32).reshape(-1, 3)
+        arrays["keyframe_sizes_%d" % n] = numpy.array([len(data) for _, data, _, _ in keyframes], dtype=numpy.int64)
+        arrays["keyframe_data_%d" % n] = numpy.frombuffer(b''.join(data for _, data, _, _ in keyframes),
+                                                          dtype=numpy.uint8)
+    arrays["index"] = numpy.frombuffer(json.dumps(index).encode(), dtype=numpy.uint8)
+    with open(path, 'wb') as file:
+        numpy.savez_compressed(file, **arrays)
+
+# Function to read the rounds of a run from a replay file
+def load_replay(path):
+    """Read a replay file written by save_replay. Raises ValueError if it is not one."""
+    with open(path, 'rb') as file:
+        archive = numpy.load(io.BytesIO(file.read()), allow_pickle=False)
+    index = json.loads(archive["index"].tobytes())
+    if index["version"] != REPLAY_VERSION:
+        # Older replays drew their rounds from other random generators or flooded differently,
+        # and cannot be played back
+        raise ValueError("Replay version %d is not supported by this game (version %d)" % (index["version"], REPLAY_VERSION))
+    rounds = []
+    for n, meta in enumerate(index["rounds"]):
+        replay_round = ReplayRound(meta["seed"], meta["width"], meta["height"], meta["difficulty"],
+                                   meta["round_count"], meta["rng_state"], meta["flood_mode"])
+        replay_round.outcome = meta["outcome"]
+        replay_round.steps = archive["steps_%d" % n].tolist()
+        replay_round.moves = [tuple(move) for move in archive["moves_%d" % n].tolist()]
+        data = archive["keyframe_data_%d" % n].tobytes()
+        ends = numpy.cumsum(archive["keyframe_sizes_%d" % n]).tolist()
+        starts = [0] + ends[:-1]
+        replay_round.keyframes = [(tick, data[start:end], water_time, rng_state) for (tick, water_time, rng_state), start, end
+                                  in zip(meta["keyframes"], starts, ends)]
+        rounds.append(replay_round)
+    return rounds
+
+# Player of a recorded run
+class ReplayPlayer:
+    """Rebuilds the state of any round at any tick of a recorded run, without rendering."""
+    def __init__(self, rounds):
+        self.rounds = rounds
+
+    def ticks(self, round_index):
+        return len(self.rounds[round_index].steps)
+
+    def seek(self, round_index, tick):
+        """
+        Return the RoundState after `tick` ticks of a round, restored from the
+        nearest earlier keyframe and fast-forwarded from there.
+        """
+        replay_round = self.rounds[round_index]
+        tick = max(0, min(tick, len(replay_round.steps)))
+        keyframe = None
+        for candidate in replay_round.keyframes:
+            if candidate[0] <= tick:
+                keyframe = candidate
+        if keyframe is None:
+            state, start = replay_round.initial_state(), 0
+        else:
+            state, start = replay_round.restore_keyframe(keyframe), keyframe[0]
+        return self.fast_forward(replay_round, state, start, tick)
+
+    def fast_forward(self, replay_round, state, start, end):
+        """Run ticks `start` to `end` of the round on `state`, as fast as possible."""
+        moves = [move for move in replay_round.moves if start <= move[0] < end]
+        next_move = 0
+        for tick in range(start, end):
+            while next_move < len(moves) and moves[next_move][0] == tick:
+                state.queue_move(moves[next_move][1], moves[next_move][2])  # Made after the tick's flood
+                next_move += 1
+            state.tick(replay_round.steps[tick] / 1000)
+        return state
+
+# Summarize a replay file from the command line
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect a Floating Maze replay")
+    parser.add_argument("replay", help="replay file written with maze-game.py --record")
+    parser.add_argument("--round", type=int, default=None, help="round to seek in (0-based)")
+    parser.add_argument("--time", type=float, default=None, help="seconds into the --round to seek to")
+    args = parser.parse_args(argv)
+    if args.time is not None and args.round is None:
+        parser.error("--time needs --round")
+
+    rounds = load_replay(args.replay)
+    player = ReplayPlayer(rounds)
+    survived = 0
+    for n, replay_round in enumerate(rounds):
+        seconds = sum(replay_round.steps) / 1000
+        print("round %d: seed %s, %dx%d, %d ticks (%.1f s), %d moves, %d keyframes, %s" % (
+            n, replay_round.seed, replay_round.width, replay_round.height, len(replay_round.steps),
+            seconds, len(replay_round.moves), len(replay_round.keyframes), replay_round.outcome or 'unfinished'))
+        survived += replay_round.outcome == 'won'
+    print("rounds survived: %d" % survived)
+
+    if args.round is not None:
+        steps = rounds[args.round].steps
+        tick = len(steps) if args.time is None else int(numpy.searchsorted(numpy.cumsum(steps), args.time * 1000))
+        state = player.seek(args.round, tick)
+        print("round %d, tick %d: player at %s, %d cells flooded, %s" % (
+            args.round, tick, tuple(state.player_pos), int(state.water_grid.array.sum()),
+            state.outcome or 'playing'))
+
+if __name__ == "__main__":
+    main()
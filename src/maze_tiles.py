@@ -0,0 +1,233 @@
+'''
+Floating Maze - giant tiled mazes
+Version 20241111
+Copyright: DOF Studio
+
+Mazes of tens of millions of cells for endurance events. The cells live in a
+memory-mapped file: the generator writes the maze one tile at a time and lets
+each finished band of tiles go from memory, and the game, the flood and the
+pathfinding read the cells through the mapping, so the operating system only
+pages in the parts that are used. Opening a maze file again only maps it.
+
+Usage: python maze_tiles.py create giant.amzt --width 6001 --height 6001 [--seed N]
+       python maze_tiles.py info giant.amzt
+'''
+
+import os
+import mmap
+import time
+import struct
+import argparse
+import tempfile
+import numpy
+from maze_engine import DEFAULT_DIFFICULTY, CELL_WALL, CELL_PATH, CELL_EXIT, MazeGrid, WaterGrid, RandomStream, RoundState, generate_maze
+
+# Maze file layout: a header padded to DATA_OFFSET, then one byte per cell in row-major order.
+# The offset is a multiple of the mapping granularity of every platform, so the cells map on their own.
+TILED_MAGIC = b'AMZT'
+TILED_VERSION = 1
+TILED_HEADER = struct.Struct('<4sHHIIqI')  # Magic, version, tile size, width, height, seed, difficulty
+DATA_OFFSET = 65536
+
+# Width and height of a tile in cells (even, so tile borders fall on wall rows and columns)
+TILE_CELLS = 64
+
+# Grid whose cells are a memory-mapped region of a file
+class MappedGrid:
+    """
+    Mixin for the Grid classes keeping the cells in a memory-mapped file instead
+    of a bytearray. `data` is the mmap and `array` a NumPy view of it, so the
+    engine reads and writes cells as usual while only the pages in use are
+    loaded. A grid mapped from a named file pickles as its path and is mapped
+    again on load; one on an anonymous scratch file cannot be pickled.
+    """
+    def map(self, file, width, height, offset=0, writable=False, path=None):
+        self.width = width
+        self.height = height
+        self.offset = offset
+        self.writable = writable
+        self.path = path
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self.data = mmap.mmap(file.fileno(), width * height, access=access, offset=offset)
+        self.array = numpy.frombuffer(self.data, dtype=self.dtype).reshape(height, width)
+
+    def release(self, y0=0, y1=None):
+        """Write back rows `y0` to `y1` and let the operating system drop their pages from memory."""
+        y1 = self.height if y1 is None else y1
+        start = y0 * self.width // mmap.PAGESIZE * mmap.PAGESIZE
+        end = min(y1 * self.width, len(self.data))
+        if end <= start:
+            return
+        if self.writable:
+            self.data.flush(start, end - start)
+        if hasattr(mmap, 'MADV_DONTNEED'):  # Not on Windows, where unused pages are trimmed anyway
+            self.data.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def __getstate__(self):
+        if self.path is None:
+            raise TypeError("a grid mapped on a scratch file cannot be pickled")
+        return (self.path, self.width, self.height, self.offset, self.writable)
+
+    def __setstate__(self, state):
+        path, width, height, offset, writable = state
+        with open(path, 'r+b' if writable else 'rb') as file:
+            self.map(file, width, height, offset, writable, path)
+
+# Maze grid in a maze file
+class MappedMazeGrid(MappedGrid, MazeGrid):
+    def __init__(self, path, width, height, offset=DATA_OFFSET, writable=False):
+        with open(path, 'r+b' if writable else 'rb') as file:
+            self.map(file, width, height, offset, writable, path)
+
+    def copy(self):
+        """An in-memory copy of the maze."""
+        return MazeGrid(self.width, self.height, data=self.data)
+
+# Water grid in an anonymous scratch file
+class MappedWaterGrid(MappedGrid, WaterGrid):
+    def __init__(self, width, height, directory=None):
+        # The file is deleted when closed; the mapping keeps its pages until the grid is gone
+        with tempfile.TemporaryFile(dir=directory) as file:
+            file.truncate(width * height)  # A sparse file of dry cells
+            self.map(file, width, height, writable=True)
+
+    def copy(self):
+        """An in-memory copy of the water grid."""
+        return WaterGrid(self.width, self.height, data=self.data)
+
+# Function to plan which tiles connect to which
+def tile_doors(columns, rows, rng):
+    """
+    Return (right, down): the sets of tiles (tx, ty) with a door to the tile on
+    their right and below. The doors form a random spanning tree of the tiles, so
+    joining perfect tile mazes with them gives one perfect maze.
+    """
+    right, down = set(), set()
+    seen = {(0, 0)}
+    stack = [(0, 0)]
+    while stack:
+        tx, ty = stack[-1]
+        neighbours = [(tx + dx, ty + dy) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+                      if 0 <= tx + dx < columns and 0 <= ty + dy < rows and (tx + dx, ty + dy) not in seen]
+        if not neighbours:
+            stack.pop()
+            continue
+        nx, ny = neighbours[int(rng.random() * len(neighbours))]
+        if ny == ty:
+            right.add((min(tx, nx), ty))
+        else:
+            down.add((tx, min(ty, ny)))
+        seen.add((nx, ny))
+        stack.append((nx, ny))
+    return right, down
+
+# Function to generate a giant maze into a maze file
+def create_tiled_maze(path, width, height, seed=0, difficulty=DEFAULT_DIFFICULTY, tile=TILE_CELLS):
+    """
+    Generate a maze tile by tile into a maze file and return it opened.
+
+    Each tile is a generate_maze maze of its own (all drawing from one
+    RandomStream seeded by `seed`, with dead ends by `difficulty`), and
+    neighbouring tiles are joined by
+    one door in their shared wall along a random spanning tree. The last tile of
+    a row or column also takes the cells left over. Only one band of tiles is in
+    memory at a time. The start is (1, 1) and the exit (width - 2, height - 2),
+    as in generate_maze.
+    """
+    if tile < 4 or tile % 2:
+        raise ValueError("The tile size must be even and at least 4")
+    if width < 5 or height < 5:
+        raise ValueError("A tiled maze must be at least 5x5 cells")
+    columns = max(1, (width - 2) // tile)
+    rows = max(1, (height - 2) // tile)
+    rng = RandomStream(seed)
+    right, down = tile_doors(columns, rows, rng)
+
+    with open(path, 'wb') as file:
+        file.write(TILED_HEADER.pack(TILED_MAGIC, TILED_VERSION, tile, width, height, seed, difficulty)
+                   .ljust(DATA_OFFSET, b'\0'))
+        file.truncate(DATA_OFFSET + width * height)  # A sparse file of walls
+    maze = MappedMazeGrid(path, width, height, writable=True)
+    cells = maze.array
+
+    for ty in range(rows):
+        y0 = ty * tile
+        th = tile if ty < rows - 1 else height - 1 - y0  # Rows of the tile up to its bottom wall
+        for tx in range(columns):
+            x0 = tx * tile
+            tw = tile if tx < columns - 1 else width - 1 - x0
+            local = generate_maze(tw + 1, th + 1, difficulty=difficulty, rng=rng)
+            # Only the maze's own exit stays; the tile's exit cell goes back to what carving left
+            local.set(tw - 1, th - 1, CELL_PATH if tw % 2 == 0 and th % 2 == 0 else CELL_WALL)
+            cells[y0 + 1:y0 + th, x0 + 1:x0 + tw] = local.array[1:th, 1:tw]
+
+            # Open the doors on the right and bottom walls, at a cell row or column of the tile
+            if (tx, ty) in right:
+                cells[y0 + 2 * int(rng.random() * (th // 2)) + 1, x0 + tw] = CELL_PATH
+            if (tx, ty) in down:
+                cells[y0 + th, x0 + 2 * int(rng.random() * (tw // 2)) + 1] = CELL_PATH
+        maze.release(y0, y0 + th + 1)
+
+    maze.set(width - 2, height - 2, CELL_EXIT)  # Mark the exit
+    maze.release()  # The writable mapping goes with `maze`; the file is opened read-only from here
+    return open_tiled_maze(path)
+
+# Function to open a maze file
+def open_tiled_maze(path):
+    """
+    Map a maze file read-only and return its MappedMazeGrid, with the `seed`,
+    `difficulty` and `tile` it was generated with. Raises ValueError if the file
+    is not a maze file.
+    """
+    with open(path, 'rb') as file:
+        header = file.read(TILED_HEADER.size)
+    if len(header) < TILED_HEADER.size:
+        raise ValueError("Not a tiled maze file")
+    magic, version, tile, width, height, seed, difficulty = TILED_HEADER.unpack(header)
+    if magic != TILED_MAGIC:
+        raise ValueError("Not a tiled maze file")
+    if version > TILED_VERSION:
+        raise ValueError("Tiled maze version %d is newer than this game supports" % version)
+    if os.path.getsize(path) < DATA_OFFSET + width * height:
+        raise ValueError("Tiled maze file is truncated")
+    maze = MappedMazeGrid(path, width, height)
+    maze.seed, maze.difficulty, maze.tile = seed, difficulty, tile
+    return maze
+
+# Function to start a round on a giant maze
+def tiled_round(maze, round_count=1, rng=None):
+    """
+    A RoundState on a maze file, flooding a water grid mapped on a scratch file
+    next to it. The flood spreads frame by frame ('queue' mode); precomputing it
+    would need arrays over every cell.
+    """
+    maze.release()  # Start the round without the pages of the last one
+    water_grid = MappedWaterGrid(maze.width, maze.height, os.path.dirname(os.path.abspath(maze.path)))
+    return RoundState(maze, round_count, rng, 'queue', water_grid=water_grid)
+
+# Create or describe maze files from the command line
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create and inspect giant Floating Maze files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="generate a maze file")
+    create.add_argument("path", help="maze file to write (.amzt)")
+    create.add_argument("--width", type=int, required=True, help="maze width in cells")
+    create.add_argument("--height", type=int, required=True, help="maze height in cells")
+    create.add_argument("--seed", type=int, default=0, help="maze seed")
+    create.add_argument("--difficulty", type=int, default=DEFAULT_DIFFICULTY, help="dead ends per tile (0-100)")
+    create.add_argument("--tile", type=int, default=TILE_CELLS, help="tile size in cells (even)")
+    info = commands.add_parser("info", help="describe a maze file")
+    info.add_argument("path", help="maze file (.amzt)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command == "create":
+        maze = create_tiled_maze(args.path, args.width, args.height, args.seed, args.difficulty, args.tile)
+    else:
+        maze = open_tiled_maze(args.path)
+    print("%s: %dx%d cells (%.1f M), seed %d, difficulty %d, %dx%d tiles, %.2f s" % (
+        args.path, maze.width, maze.height, maze.width * maze.height / 1e6, maze.seed, maze.difficulty,
+        maze.tile, maze.tile, time.perf_counter() - start))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+'''
+Floating Maze - retained-mode widgets
+Version 20241111
+Copyright: DOF Studio
+
+Buttons, labels and input boxes for the menus and the game's button bar. A
+widget renders its surfaces once, with fonts shared by size, and again only
+when its text changes; hovering swaps between pre-rendered surfaces. A Panel
+draws only the widgets that changed and returns their rects for
+pygame.display.update. Clicks, mouse motion and typing reach the widgets as
+pygame events through Panel.handle_event, so no screen polls the mouse.
+Notifications are shown over a screen for a while without stopping it.
+'''
+
+import queue
+import pygame
+
+# Default text and field colors
+TEXT_COLOR = (0, 0, 0)
+FIELD_COLOR = (255, 255, 255)
+NOTIFICATION_COLOR = (255, 165, 0)
+
+# Fonts by size, shared by every widget
+_fonts = {}
+
+# Function to get the default font at a size, loaded once
+def get_font(size):
+    font = _fonts.get(size)
+    if font is None:
+        font = _fonts[size] = pygame.font.Font(None, size)
+    return font
+
+# Base class of the widgets
+class Widget:
+    """
+    A rect of the screen with pre-rendered contents. `dirty` is set when the
+    contents change and cleared by the Panel drawing it; `drawn` is the rect it
+    was last drawn at, which the Panel clears again when the widget moves.
+    """
+    def __init__(self, rect):
+        self.rect = pygame.Rect(rect)
+        self.dirty = True
+        self.drawn = None
+
+    def handle_event(self, event):
+        """React to an event; return True if it activated the widget (a click, or Enter)."""
+        return False
+
+    def draw(self, surface):
+        surface.blit(self.surface, self.rect)
+
+# Line of text
+class Label(Widget):
+    def __init__(self, text, pos, font_size=30, color=TEXT_COLOR):
+        self.font = get_font(font_size)
+        self.color = color
+        self.pos = pos
+        self.text = None
+        Widget.__init__(self, (pos, (0, 0)))
+        self.set_text(text)
+
+    def set_text(self, text):
+        if text != self.text:
+            self.text = text
+            self.surface = self.font.render(text, True, self.color)
+            self.rect = self.surface.get_rect(topleft=self.pos)
+            self.dirty = True
+
+# Push button with a hover color
+class Button(Widget):
+    def __init__(self, text, rect, inactive_color, active_color, font_size=30, color=TEXT_COLOR):
+        Widget.__init__(self, rect)
+        label = get_font(font_size).render(text, True, color)
+        center = (self.rect.width // 2, self.rect.height // 2)
+        self.surfaces = []
+        for background in (inactive_color, active_color):
+            surface = pygame.Surface(self.rect.size)
+            surface.fill(background)
+            surface.blit(label, label.get_rect(center=center))
+            self.surfaces.append(surface)
+        self.hovered = bool(pygame.mouse.get_focused() and self.rect.collidepoint(pygame.mouse.get_pos()))
+        self.surface = self.surfaces[self.hovered]
+
+    def set_hovered(self, hovered):
+        if hovered != self.hovered:
+            self.hovered = hovered
+            self.surface = self.surfaces[hovered]
+            self.dirty = True
+
+    def handle_event(self, event):
+        if event.type == pygame.MOUSEMOTION:
+            self.set_hovered(self.rect.collidepoint(event.pos))
+        elif event.type == pygame.WINDOWLEAVE:
+            self.set_hovered(False)
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == pygame.BUTTON_LEFT:
+            return self.rect.collidepoint(event.pos)
+        return False
+
+# One-line text field
+class InputBox(Widget):
+    """
+    A framed text field taking the keys typed (only digits with `digit_only`,
+    at most `max_length` characters); Enter activates it.
+    """
+    def __init__(self, rect, digit_only=False, max_length=None, font_size=30, color=TEXT_COLOR,
+                 background=FIELD_COLOR):
+        Widget.__init__(self, rect)
+        self.digit_only = digit_only
+        self.max_length = max_length
+        self.font = get_font(font_size)
+        self.color = color
+        self.background = background
+        self.text = ""
+        self.render()
+
+    def render(self):
+        self.surface = pygame.Surface(self.rect.size)
+        self.surface.fill(self.background)
+        pygame.draw.rect(self.surface, self.color, self.surface.get_rect(), 2)
+        self.surface.blit(self.font.render(self.text, True, self.color), (5, 5))
+        self.dirty = True
+
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN:
+            return False
+        if event.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
+            return True
+        if event.key == pygame.K_BACKSPACE:
+            text = self.text[:-1]
+        elif event.unicode.isprintable() and (event.unicode.isdigit() or not self.digit_only):
+            text = (self.text + event.unicode)[:self.max_length]
+        else:
+            return False
+        if text != self.text:
+            self.text = text
+            self.render()
+        return False
+
+# Group of widgets drawn together
+class Panel:
+    """
+    Widgets over a background. `draw` paints the widgets that changed (all of
+    them after `invalidate`) and returns the rects to update; `handle_event`
+    passes an event to every widget and returns the one it activated, if any.
+
+    Args:
+        widgets: the widgets, drawn in order.
+        background: function painting the background onto a surface (it is
+            clipped to the area being repainted), or None for opaque widgets
+            drawn over something else.
+    """
+    def __init__(self, widgets=(), background=None):
+        self.widgets = list(widgets)
+        self.background = background
+        self.full_redraw = True
+
+    def add(self, widget):
+        self.widgets.append(widget)
+        return widget
+
+    def invalidate(self):
+        """Draw everything on the next `draw`, e.g. after something else was drawn over the panel."""
+        self.full_redraw = True
+
+    def handle_event(self, event):
+        activated = None
+        for widget in self.widgets:
+            if widget.handle_event(event) and activated is None:
+                activated = widget
+        return activated
+
+    def draw(self, surface):
+        full = self.full_redraw
+        self.full_redraw = False
+        if full and self.background is not None:
+            self.background(surface)
+        dirty = []
+        for widget in self.widgets:
+            if not (full or widget.dirty):
+                continue
+            # Clear where the widget was, in case it moved or shrank
+            area = widget.rect if widget.drawn is None else widget.rect.union(widget.drawn)
+            if not full and self.background is not None:
+                surface.set_clip(area)
+                self.background(surface)
+                surface.set_clip(None)
+            widget.draw(surface)
+            widget.drawn = widget.rect
+            widget.dirty = False
+            dirty.append(area)
+        if full and self.background is not None:
+            return [surface.get_rect()]
+        return dirty
+
+# Messages shown over the screen for a while
+class Notifications:
+    """
+    Queue of messages shown one at a time at the top left of the screen, each
+    for its duration, while the screen goes on being drawn. `post` may be
+    called from any thread, e.g. when a save finishes in the background.
+    """
+    def __init__(self, pos=(10, 10), font_size=36, color=NOTIFICATION_COLOR):
+        self.pending = queue.SimpleQueue()
+        self.pos = pos
+        self.font_size = font_size
+        self.color = color
+        self.surface = None
+        self.until = 0
+
+    def post(self, message, duration=1500):
+        self.pending.put((message, duration))
+
+    def update(self):
+        """
+        Move on to the next message once the current one has been shown long
+        enough. Return True when a message went away, so the screen under it
+        must be drawn again.
+        """
+        now = pygame.time.get_ticks()
+        if self.surface is not None and now < self.until:
+            return False
+        cleared = self.surface is not None
+        self.surface = None
+        try:
+            message, duration = self.pending.get_nowait()
+        except queue.Empty:
+            return cleared
+        self.surface = get_font(self.font_size).render(message, True, self.color)
+        self.until = now + duration
+        return cleared
+
+    def draw(self, surface):
+        """Draw the current message, if any, and return the rects to update."""
+        if self.surface is None:
+            return []
+        return [surface.blit(self.surface, self.pos)]